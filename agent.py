@@ -1,14 +1,18 @@
 from helpers import LLMChat
+from model_routing import AGENT_STEP
 import json
 
 import os
 
 class Action:
-    def __init__(self, action_input):
+    def __init__(self, action_input, fs=None):
         self.action_input = action_input
+        self.fs = fs
 
     def read(self):
         try:
+            if self.fs is not None:
+                return self.fs.read(self.action_input['file_location'])
             with open(self.action_input['file_location'], 'r') as file:
                 content = file.read()
             return content
@@ -21,6 +25,9 @@ class Action:
 
     def edit(self):
         try:
+            if self.fs is not None:
+                self.fs.write(self.action_input['file_location'], self.action_input['file_content'])
+                return f"Successfully replaced content in '{self.action_input['file_location']}'."
             with open(self.action_input['file_location'], 'w') as file:
                 file.write(self.action_input['file_content'])
             return f"Successfully replaced content in '{self.action_input['file_location']}'."
@@ -33,11 +40,16 @@ class Action:
 
     def add(self):
         try:
+            if self.fs is not None:
+                self.fs.add(self.action_input['file_location'], self.action_input['file_content'])
+                return f"Successfully created new file '{self.action_input['file_location']}' with the provided content."
             if os.path.exists(self.action_input['file_location']):
                 return f"Error: File '{self.action_input['file_location']}' already exists."
             with open(self.action_input['file_location'], 'w') as file:
                 file.write(self.action_input['file_content'])
             return f"Successfully created new file '{self.action_input['file_location']}' with the provided content."
+        except FileExistsError:
+            return f"Error: File '{self.action_input['file_location']}' already exists."
         except PermissionError:
             return f"Error: Permission denied to create file '{self.action_input['file_location']}'."
         except Exception as e:
@@ -45,31 +57,49 @@ class Action:
 
 
 class Agent:
-    def __init__(self, task_desc,issue,repo_state,max_steps=10):
-        self.chat = LLMChat(task_desc)
+    def __init__(self, task_desc,issue,repo_state,max_steps=10,fs=None,cancel_event=None,stage=AGENT_STEP):
+        # stage picks the model routing entry used for every step of this agent
+        self.chat = LLMChat(task_desc, stage=stage)
         self.issue  = issue
         self.repo_state = repo_state
         self.max_steps = max_steps
         self.scratchpad = []
+        # OverlayFS the actions run against; None falls back to the real disk
+        self.fs = fs
+        # threading.Event that aborts the loop between steps, e.g. when a sibling candidate already won
+        self.cancel_event = cancel_event
     def _parse_agent_response(self,response):
         res_json = json.loads(response.replace("```json","").replace("```",""))
         thought = res_json["thought"]
         action = res_json['action']
         action_input = res_json['action_input']
         self.scratchpad.append(res_json)
+        if isinstance(action_input, dict) and 'file_content' in action_input:
+            # the written content is in the repo now, the history only needs the path
+            self.chat.set_last_reply_summary(json.dumps({
+                "thought": thought, "action": action,
+                "action_input": {"file_location": action_input.get('file_location', '')}}))
         return thought,action,action_input
     def execute(self):
         steps = 0 
         user_prompt = f"Issue:{self.issue}, Repo Dir Tree: {self.repo_state}"
+        summary = None
         while steps < self.max_steps:
-            response = self.chat.llm_call(user_prompt)
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                return None, None
+            response = self.chat.llm_call(user_prompt, summary=summary)
             print(response)
             thought, action_to_take , action_input = self._parse_agent_response(response)
-            action =  Action(action_input)
+            action =  Action(action_input, fs=self.fs)
+            summary = None
             if action_to_take == "<done>":
+                print(f"Prompt tokens per step: {self.chat.prompt_sizes}")
                 return thought, action_input
             elif action_to_take == "<read>":
-                user_prompt = f"Observation: {action.read()}"
+                content = action.read()
+                user_prompt = f"Observation: {content}"
+                summary = (f"Observation: contents of '{action_input.get('file_location', '')}' omitted "
+                           f"({len(content)} chars), <read> it again if needed.")
             elif action_to_take == "<add>":
                 user_prompt = f"Observation: {action.add()}"
             elif action_to_take == "<edit>":
@@ -1,10 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
 import logging
 from ide_qr_bot_v0 import QRBot
 from helpers import check_and_delete_folder
+from metrics import render_prometheus, request_scope
+from llm_telemetry import get_llm_telemetry
+from tracing import trace_request
+from deadline import deadline_scope
+from prompt_registry import get_prompt_registry
+from section_index import get_section_index
 import tempfile
 import shutil
 from dotenv import load_dotenv
@@ -25,6 +31,10 @@ CORS(app, resources={
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Build the system prompts, per-question prefixes and section index before the first request
+get_prompt_registry()
+get_section_index()
+
 # Configure upload settings
 UPLOAD_FOLDER = os.path.join(tempfile.gettempdir(), 'uploads')
 ALLOWED_EXTENSIONS = {'zip'}
@@ -50,9 +60,26 @@ def home():
     """Health check endpoint."""
     return jsonify({"status": "ok"}), 200
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics endpoint."""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/llm')
+def llm_metrics_endpoint():
+    """Per-prompt LLM token, size and latency telemetry as JSON."""
+    return jsonify(get_llm_telemetry())
+
 @app.route('/process', methods=['POST'])
 def process_file():
     """Process uploaded file and generate response."""
+    with request_scope(), deadline_scope(), trace_request('/process', request.headers.get('X-Request-ID')) as trace:
+        g.request_id = trace.request_id
+        result = _process_file()
+        trace.set(status=result[1] if isinstance(result, tuple) else 200)
+        return result
+
+def _process_file():
     try:
         logger.info("Received file upload request")
         logger.info(f"Files in request: {list(request.files.keys())}")
@@ -127,6 +154,8 @@ def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', 'https://ide-mentor-bot-frontend.onrender.com')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    if getattr(g, 'request_id', None):
+        response.headers['X-Request-ID'] = g.request_id
     return response
 
 # Error handlers
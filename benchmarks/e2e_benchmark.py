@@ -0,0 +1,233 @@
+# benchmarks/e2e_benchmark.py
+"""
+End-to-end throughput/latency benchmark for /process.
+
+Starts the fake LLM server, runs the Flask app under gunicorn with the stub
+docker CLI on PATH, replays a corpus of (zip, HTML query) pairs at a target
+concurrency and reports throughput, p50/p95/p99 latency and the per-stage
+breakdown from the request traces, for every worker x thread combination.
+
+    python -m benchmarks.e2e_benchmark --workers 1,2,4 --threads 1,4 --concurrency 8 --requests 64
+    python -m benchmarks.e2e_benchmark --manifest corpus.jsonl --llm-latency 2500:0.6
+    python -m benchmarks.e2e_benchmark --llm-latency 3000:1.0 --hedge-llm-latency 800:0.3
+
+A manifest line is {"zip": "path/RJSCPYQN94.zip", "query": "<p>...</p>"}; the
+zip file name must be a question_command_id from commands.csv.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fake_llm_server import make_server
+from metrics import percentile
+from tracing import summarize_traces
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_DOCKER_DIR = os.path.join(REPO_ROOT, "benchmarks", "fake_docker")
+
+SYNTHETIC_QUESTION_ID = "RJSCPYQN94"
+SYNTHETIC_QUERIES = [
+    "<p>my test cases are failing for the home route</p>",
+    "<p>I am getting an error: TypeError cannot read property map of undefined</p>",
+    "<p>how do I implement the saved videos route?</p>",
+    "<p>what is the difference between props and state?</p>",
+    "<p>npm start is not working in the terminal</p>",
+    "<p>ccbp submit RJSCPYQN94 fails</p>",
+]
+
+
+def build_synthetic_corpus(target_dir):
+    """Zip the sample project under workspace/ once and pair it with a mix of queries."""
+    zip_path = os.path.join(target_dir, f"{SYNTHETIC_QUESTION_ID}.zip")
+    source = os.path.join(REPO_ROOT, "workspace")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for root, dirs, files in os.walk(source):
+            dirs[:] = [d for d in dirs if d != "node_modules"]
+            for file in files:
+                file_path = os.path.join(root, file)
+                zf.write(file_path, os.path.relpath(file_path, source))
+    return [{"zip": zip_path, "query": query} for query in SYNTHETIC_QUERIES]
+
+
+def load_manifest(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"App did not come up at {url}")
+
+
+def start_app(app_module, workers, threads, llm_url, run_dir, args, hedge_url=None):
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "PATH": FAKE_DOCKER_DIR + os.pathsep + env.get("PATH", ""),
+        "LLM_BASE_URL": llm_url,
+        "api_key": "benchmark",
+        "TRACE_LOG_DIR": os.path.join(run_dir, "traces"),
+        "FAKE_DOCKER_LATENCY": args.docker_latency,
+        "FAKE_DOCKER_TEST_LATENCY": args.test_latency,
+    })
+    if hedge_url:
+        env.update({"LLM_HEDGE_BASE_URL": hedge_url, "LLM_HEDGE_MODEL": "fake-hedge-model"})
+    # the app deletes and recreates ./workspace, so it must not run inside the repo
+    shutil.copy(os.path.join(REPO_ROOT, "commands.csv"), run_dir)
+    command = [
+        sys.executable, "-m", "gunicorn", f"{app_module}:app",
+        "--config", os.path.join(REPO_ROOT, "gunicorn.conf.py"),
+        "--workers", str(workers), "--threads", str(threads),
+        "--bind", f"127.0.0.1:{port}", "--chdir", run_dir,
+        "--timeout", "600", "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_until_up(base_url + "/")
+    except Exception:
+        process.kill()
+        raise
+    return process, base_url
+
+
+def replay(base_url, corpus, total_requests, concurrency):
+    def send(item):
+        start = time.perf_counter()
+        with open(item["zip"], "rb") as f:
+            response = requests.post(
+                base_url + "/process",
+                files={"zip": (os.path.basename(item["zip"]), f, "application/zip")},
+                data={"query": item["query"]},
+                timeout=900,
+            )
+        return time.perf_counter() - start, response.status_code
+
+    items = list(itertools.islice(itertools.cycle(corpus), total_requests))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, items))
+    wall = time.perf_counter() - start
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, status in results if status != 200)
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "wall_seconds": wall,
+        "throughput_rps": len(results) / wall if wall else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def run_config(app_module, workers, threads, corpus, llm_url, args, hedge_url=None):
+    run_dir = tempfile.mkdtemp(prefix="qr-bench-")
+    process, base_url = start_app(app_module, workers, threads, llm_url, run_dir, args, hedge_url)
+    try:
+        # warm up imports and the CSV cache so they do not skew the first requests
+        replay(base_url, corpus[:1], 1, 1)
+        shutil.rmtree(os.path.join(run_dir, "traces"), ignore_errors=True)
+        result = replay(base_url, corpus, args.requests, args.concurrency)
+        time.sleep(1)  # let the background trace writers flush
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+    trace_dir = os.path.join(run_dir, "traces")
+    trace_files = [os.path.join(trace_dir, f) for f in os.listdir(trace_dir)] if os.path.isdir(trace_dir) else []
+    result["stages"] = summarize_traces(trace_files)
+    result.update({"workers": workers, "threads": threads})
+    shutil.rmtree(run_dir, ignore_errors=True)
+    return result
+
+
+def print_report(results):
+    print(f"\n{'workers':>7} {'threads':>7} {'reqs':>5} {'errors':>6} {'rps':>8} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9}")
+    for r in results:
+        print(f"{r['workers']:>7} {r['threads']:>7} {r['requests']:>5} {r['errors']:>6} "
+              f"{r['throughput_rps']:>8.2f} {r['p50']:>9.2f} {r['p95']:>9.2f} {r['p99']:>9.2f}")
+    for r in results:
+        print(f"\nStages for workers={r['workers']} threads={r['threads']}:")
+        print(f"  {'stage':<18} {'count':>6} {'p50 (s)':>9} {'p95 (s)':>9}")
+        for stage, row in sorted(r["stages"].items(), key=lambda item: item[1]["p95"], reverse=True):
+            print(f"  {stage:<18} {row['count']:>6} {row['p50']:>9.3f} {row['p95']:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end /process benchmark with fake LLM and docker")
+    parser.add_argument("--app", default="main", help="module exposing the Flask app (main or app)")
+    parser.add_argument("--manifest", help="JSONL corpus of {zip, query}; defaults to a synthetic corpus")
+    parser.add_argument("--workers", default="1,2", help="comma separated gunicorn worker counts")
+    parser.add_argument("--threads", default="1,4", help="comma separated gunicorn thread counts")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--llm-latency", default="1000:0.5", help="median_ms[:sigma]")
+    parser.add_argument("--llm-ttft", default="200:0.3", help="median_ms[:sigma]")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--hedge-llm-latency", help="start a second fake LLM server with this latency as the hedge endpoint")
+    parser.add_argument("--docker-latency", default="50:0.3", help="median_ms[:sigma]")
+    parser.add_argument("--test-latency", default="8000:0.4", help="median_ms[:sigma]")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    llm_server = make_server(port=0, latency=args.llm_latency, ttft=args.llm_ttft, error_rate=args.llm_error_rate)
+    threading.Thread(target=llm_server.serve_forever, daemon=True).start()
+    llm_url = f"http://127.0.0.1:{llm_server.server_address[1]}/v1"
+    servers = [llm_server]
+    hedge_url = None
+    if args.hedge_llm_latency:
+        hedge_server = make_server(port=0, latency=args.hedge_llm_latency, ttft=args.llm_ttft)
+        threading.Thread(target=hedge_server.serve_forever, daemon=True).start()
+        hedge_url = f"http://127.0.0.1:{hedge_server.server_address[1]}/v1"
+        servers.append(hedge_server)
+
+    corpus_dir = tempfile.mkdtemp(prefix="qr-corpus-")
+    corpus = load_manifest(args.manifest) if args.manifest else build_synthetic_corpus(corpus_dir)
+
+    results = []
+    try:
+        for workers in [int(w) for w in args.workers.split(",")]:
+            for threads in [int(t) for t in args.threads.split(",")]:
+                print(f"Running workers={workers} threads={threads} ...", flush=True)
+                results.append(run_config(args.app, workers, threads, corpus, llm_url, args, hedge_url))
+    finally:
+        for server in servers:
+            server.shutdown()
+        shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# benchmarks/fake_llm_server.py
+"""
+Local OpenAI-compatible stand-in for OpenRouter.
+
+Serves POST /v1/chat/completions (streaming and non-streaming) with canned
+answers after a configurable latency. Classification prompts get a JSON
+answer whose category is picked from keywords in the query, so the whole
+pipeline can run without a real model. Repeated system prompts are reported
+as cached prompt tokens, like a provider-side prompt cache.
+
+    python -m benchmarks.fake_llm_server --port 8901 --latency 1500:0.5 --ttft 300:0.3
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.latency import LatencyDistribution
+from constants import (
+    CATEGORY_CODES,
+    TEST_CASE_FAILURES,
+    FIX_SPECIFIC_ERRORS,
+    IMPLEMENTATION_GUIDANCE,
+    CONCEPTUAL_DOUBTS,
+    OTHER,
+)
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_HINTS = [
+    ("test", TEST_CASE_FAILURES),
+    ("error", FIX_SPECIFIC_ERRORS),
+    ("implement", IMPLEMENTATION_GUIDANCE),
+    ("what is", CONCEPTUAL_DOUBTS),
+]
+
+CANNED_ANSWER = (
+    "The failing behaviour comes from the component state not being updated after the API call. "
+    "Update the state in the success handler and render the list from state. "
+) * 8
+
+
+def _text_of(content):
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def build_reply(messages, stop=None):
+    system_prompt = _text_of(messages[0]["content"]) if messages else ""
+    user_prompt = _text_of(messages[-1]["content"]) if messages else ""
+    if "classify" in system_prompt.lower():
+        lowered = user_prompt.lower()
+        category = next((c for hint, c in CATEGORY_HINTS if hint in lowered), None)
+        if category is None:
+            category = random.choice([c for c in CATEGORY_CODES.values() if c != OTHER])
+        code = next(code for code, c in CATEGORY_CODES.items() if c == category)
+        reply = json.dumps({"c": code, "e": "", "s": user_prompt[:120]}, separators=(",", ":")) + "\n"
+    else:
+        reply = CANNED_ANSWER
+    # like the real API, stop sequences end the reply and are not included in it
+    for sequence in ([stop] if isinstance(stop, str) else stop or []):
+        if sequence in reply:
+            reply = reply[:reply.index(sequence)]
+    return reply
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    latency = LatencyDistribution("0")
+    ttft = LatencyDistribution("0")
+    error_rate = 0.0
+    seen_prefixes = set()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        messages = request.get("messages", [])
+
+        total = self.latency.sample()
+        if random.random() < self.error_rate:
+            time.sleep(total)
+            self._send_json(500, {"error": {"message": "injected failure"}})
+            return
+
+        reply = build_reply(messages, request.get("stop"))
+        system_prompt = _text_of(messages[0]["content"]) if messages else ""
+        prefix_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        cached = prefix_hash in self.seen_prefixes
+        self.seen_prefixes.add(prefix_hash)
+        usage = {
+            "prompt_tokens": len(json.dumps(messages)) // 4,
+            "prompt_tokens_details": {"cached_tokens": len(system_prompt) // 4 if cached else 0},
+            "completion_tokens": len(reply) // 4,
+            "total_tokens": (len(json.dumps(messages)) + len(reply)) // 4,
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get("model", "fake-model")
+
+        if not request.get("stream"):
+            time.sleep(total)
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        try:
+            self._stream(reply, usage, completion_id, model, total)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client hung up mid-stream, e.g. a cancelled hedge
+            logger.debug("Client closed the stream early")
+
+    def _stream(self, reply, usage, completion_id, model, total):
+        first = min(self.ttft.sample(), total) if self.ttft.median > 0 else 0.0
+        pieces = [reply[i:i + 80] for i in range(0, len(reply), 80)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        time.sleep(first)
+        step = max(0.0, total - first) / len(pieces)
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(step)
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        final = {
+            "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [], "usage": usage,
+        }
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=8901, latency="0", ttft="0", error_rate=0.0):
+    handler = type("ConfiguredFakeLLMHandler", (FakeLLMHandler,), {
+        "latency": LatencyDistribution(latency),
+        "ttft": LatencyDistribution(ttft),
+        "error_rate": error_rate,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible fake LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", default="1000:0.5", help="total latency as median_ms[:sigma]")
+    parser.add_argument("--ttft", default="200:0.3", help="time to first token as median_ms[:sigma]")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.ttft, args.error_rate)
+    print(f"Fake LLM server listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,25 @@
+# benchmarks/latency.py
+
+import random
+
+
+class LatencyDistribution:
+    """
+    Log-normal latency in seconds, parsed from "median_ms[:sigma]".
+    "0" disables the delay, "800:0.6" gives a median of 800ms with a heavy-ish tail.
+    """
+
+    def __init__(self, spec="0"):
+        median_ms, _, sigma = str(spec).partition(":")
+        self.median = float(median_ms) / 1000
+        self.sigma = float(sigma) if sigma else 0.0
+
+    def sample(self):
+        if self.median <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.median
+        return random.lognormvariate(0, self.sigma) * self.median
+
+    def __repr__(self):
+        return f"LatencyDistribution(median={self.median}s, sigma={self.sigma})"
@@ -0,0 +1,284 @@
+# benchmarks/microbench.py
+"""
+Microbenchmarks for the CPU-bound helpers, on synthetic fixtures of growing size.
+
+Reports the best-of-N wall time and the peak traced memory of every
+(function, fixture size) pair and compares them against a stored baseline:
+
+    python -m benchmarks.microbench                    # compare, exit 1 on regression
+    python -m benchmarks.microbench --update-baseline  # record a new baseline
+    python -m benchmarks.microbench --only extract_test_results --tolerance 0.3
+
+Timings are stored relative to a fixed calibration loop run at the start,
+so a baseline survives a busier or slower run of the same machine. They are
+still machine specific and not committed: record one locally before changing
+the code under test.
+"""
+
+import argparse
+import ast
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "microbench_baseline.json")
+
+REPO_SIZES = (10, 100, 1000, 5000)
+LOG_SIZES = (("1KB", 1024), ("64KB", 64 * 1024), ("1MB", 1024 * 1024))
+QUERY_SIZES = (("small", 2), ("medium", 50), ("large", 1000))
+
+REACT_UTIL_PATH = os.path.join(REPO_ROOT, "get_react_js_question_mentor_bot_response_util.py")
+REACT_UTIL_CLASS = "GetAIResponseForReactJsQuestionUtil"
+ZIP_TREE_METHODS = ("_get_folder_structure_from_zip", "_get_folder_structure_line_strs",
+                    "_get_files_content_from_zip_file")
+
+FILE_TEMPLATE = """import React, {{Component}} from 'react'
+import './index.css'
+
+class Component{index} extends Component {{
+  state = {{items: [], isLoading: true}}
+
+  componentDidMount() {{
+    this.getItems()
+  }}
+
+  getItems = async () => {{
+    const response = await fetch('https://apis.ccbp.in/items/{index}')
+    const data = await response.json()
+    this.setState({{items: data.items, isLoading: false}})
+  }}
+
+  render() {{
+    const {{items}} = this.state
+    return <ul>{{items.map(item => <li key={{item.id}}>{{item.name}}</li>)}}</ul>
+  }}
+}}
+
+export default Component{index}
+"""
+
+
+# ---------------------- Fixtures ----------------------
+
+def make_repo(root, file_count):
+    """A React-like tree with file_count source files spread over nested component folders."""
+    for index in range(file_count):
+        folder = os.path.join(root, "src", "components", f"Group{index // 20}", f"Component{index}")
+        os.makedirs(folder, exist_ok=True)
+        name = "index.js" if index % 3 else "index.css"
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+            f.write(FILE_TEMPLATE.format(index=index))
+    return root
+
+
+def make_zip(repo_root, zip_path):
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for root, _, files in os.walk(repo_root):
+            for file in files:
+                file_path = os.path.join(root, file)
+                zf.write(file_path, os.path.relpath(file_path, repo_root).replace(os.sep, "/"))
+    return zip_path
+
+
+def make_test_log(size_bytes, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    index = 0
+    while total < size_bytes:
+        index += 1
+        if index % 4 == 0:
+            line = f"\x1b[2m    at Object.<anonymous> (src/__tests__/App.test.js:{index}:5)\x1b[22m"
+        else:
+            mark = "✕" if rng.random() < 0.3 else "✓"
+            line = f"    {mark} :::TEST_{index}:::When the button is clicked then the page should show item {index}::: ({index % 90} ms)"
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)
+
+
+def make_query(paragraphs):
+    parts = []
+    for index in range(paragraphs):
+        parts.append(f"<p>My <b>test case</b> {index} is failing after I click the button, here is my code.</p>")
+        if index % 10 == 0:
+            parts.append(f'<p><img src="https://example.com/screenshot-{index}.png"></p>')
+    return "".join(parts)
+
+
+# ---------------------- Measurement ----------------------
+
+def calibration_workload():
+    data = [(i * 7919) % 10007 for i in range(200000)]
+    data.sort()
+    return "".join(str(x) for x in data[:50000])
+
+
+def calibrate(repeat=10):
+    """Best-of time of a fixed pure-Python workload; case timings are compared as multiples of it."""
+    return measure(calibration_workload, repeat)[0]
+
+
+def measure(fn, repeat):
+    """Best-of-repeat wall time and the peak traced memory of one extra run."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def load_zip_tree_util():
+    """
+    The React util class. Importing its module needs the discussions platform
+    packages; without them the class is compiled from the module's source with
+    only its zip tree methods, which need nothing but the standard library.
+    """
+    try:
+        from get_react_js_question_mentor_bot_response_util import GetAIResponseForReactJsQuestionUtil
+        return GetAIResponseForReactJsQuestionUtil
+    except (ImportError, NameError):
+        pass
+    with open(REACT_UTIL_PATH, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), REACT_UTIL_PATH)
+    cls = next(node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == REACT_UTIL_CLASS)
+    cls.body = [node for node in cls.body if isinstance(node, ast.FunctionDef) and node.name in ZIP_TREE_METHODS]
+    module = ast.Module(body=ast.parse("from typing import Any, Dict, List").body + [cls], type_ignores=[])
+    namespace = {}
+    exec(compile(module, REACT_UTIL_PATH, "exec"), namespace)
+    return namespace[REACT_UTIL_CLASS]
+
+
+def build_cases(workdir):
+    """Yields (name, callable, repeat) for every function and fixture size."""
+    from helpers import parse_html_to_dict, extract_file_contents_with_tree, get_question_details_from_zip
+    from get_test_cases_results import extract_test_results
+
+    ReactUtil = load_zip_tree_util()
+
+    for label, paragraphs in QUERY_SIZES:
+        html = make_query(paragraphs)
+        yield f"parse_html_to_dict[{label}]", lambda html=html: parse_html_to_dict(html), 20
+
+    for label, size in LOG_SIZES:
+        log = make_test_log(size)
+        yield f"extract_test_results[{label}]", lambda log=log: extract_test_results(log), 10
+
+    for file_count in REPO_SIZES:
+        repo = make_repo(os.path.join(workdir, f"repo_{file_count}"), file_count)
+        zip_path = make_zip(repo, os.path.join(workdir, f"repo_{file_count}.zip"))
+        repeat = 3 if file_count >= 1000 else 10
+        yield (f"extract_file_contents_with_tree[{file_count}]",
+               lambda repo=repo: extract_file_contents_with_tree(repo, full_desc=True), repeat)
+
+        zf = zipfile.ZipFile(zip_path)
+        structure = ReactUtil._get_folder_structure_from_zip(zf, [])
+        util = ReactUtil.__new__(ReactUtil)
+        yield (f"_get_folder_structure_from_zip[{file_count}]",
+               lambda zf=zf: ReactUtil._get_folder_structure_from_zip(zf, [r"^node_modules/"]), repeat)
+        yield (f"_get_folder_structure_line_strs[{file_count}]",
+               lambda s=structure: util._get_folder_structure_line_strs(s, []), repeat)
+        yield (f"_get_files_content_from_zip_file[{file_count}]",
+               lambda zf=zf: ReactUtil._get_files_content_from_zip_file(zf, [r"^node_modules/"]), repeat)
+
+    def catalog_lookup():
+        with contextlib.redirect_stdout(io.StringIO()):
+            get_question_details_from_zip("RJSCPYQN94")
+    yield "catalog_lookup[commands.csv]", catalog_lookup, 10
+
+
+def run(only=None):
+    calibration = calibrate()
+    print(f"{'calibration':<48} {calibration * 1000:>10.2f} ms", flush=True)
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="qr-microbench-")
+    cwd = os.getcwd()
+    os.chdir(REPO_ROOT)  # the catalog lookup reads commands.csv from the working directory
+    try:
+        for name, fn, repeat in build_cases(workdir):
+            if only and not name.startswith(only):
+                continue
+            seconds, peak = measure(fn, repeat)
+            results[name] = {"seconds": seconds, "relative": seconds / calibration, "peak_bytes": peak}
+            print(f"{name:<48} {seconds * 1000:>10.2f} ms {peak / 1024:>12.1f} KiB", flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance, memory_tolerance, min_seconds):
+    """Names of the cases slower or hungrier than the baseline allows, after scaling it to this run's calibration."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or "relative" not in base:
+            continue
+        calibration = current["seconds"] / current["relative"]
+        expected = base["relative"] * calibration
+        slower = current["seconds"] > expected * (1 + tolerance) and current["seconds"] - expected > min_seconds
+        hungrier = current["peak_bytes"] > base["peak_bytes"] * (1 + memory_tolerance)
+        if slower or hungrier:
+            regressions.append(
+                f"{name}: {current['seconds'] * 1000:.2f} ms (baseline {expected * 1000:.2f} ms), "
+                f"{current['peak_bytes'] / 1024:.1f} KiB (baseline {base['peak_bytes'] / 1024:.1f} KiB)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Helpers microbenchmarks with regression thresholds")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--only", help="run only cases whose name starts with this prefix")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="allowed relative peak memory growth")
+    parser.add_argument("--min-seconds", type=float, default=0.001,
+                        help="ignore slowdowns smaller than this many seconds (timer noise)")
+    args = parser.parse_args()
+
+    results = run(args.only)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline first")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.memory_tolerance, args.min_seconds)
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# catalog.py
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from question_context import build_question_contexts, compact_question_content, find_boilerplate
+from test_case_index import TestCaseIndex
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", "commands.csv")
+# Compacted contexts kept for question content that arrives without a question ID and matches no catalog question
+CONTENT_CONTEXT_CACHE_SIZE = int(os.getenv("CONTENT_CONTEXT_CACHE_SIZE", "256"))
+
+
+def _content_hash(content):
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+def _text(value):
+    """Cell value as a string, with empty cells as "" rather than "nan"."""
+    return "" if pd.isna(value) else str(value)
+
+
+class Question:
+    """One row of commands.csv."""
+
+    def __init__(self, row):
+        self.question_id = _text(row["question_id"]).strip()
+        self.question_name = _text(row["question_name"])
+        self.question_command_id = _text(row["question_command_id"]).strip()
+        self.question_folder_location = _text(row["question_folder_location"])
+        self.question_tmp_folder_location = _text(row["question_tmp_folder_location"])
+        self.question_content = _text(row["question_content"])
+        self.question_test_cases = _text(row["question_test_cases"])
+        self.test_cases = TestCaseIndex.build(
+            self.question_test_cases, os.path.join(self.question_tmp_folder_location, "__tests__"))
+        # compact question_content for prompts, filled in when the catalog loads
+        self.question_context = self.question_content
+        self.question_context_tokens = None
+
+    def get(self, column_name):
+        return getattr(self, column_name, None)
+
+
+class QuestionCatalog:
+    """
+    commands.csv parsed once and indexed by question_command_id and question_id.
+    The file is re-read only when its modification time changes.
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self.by_command_id = {}
+        self.by_question_id = {}
+        self.by_content_hash = {}
+        # lines most questions share, dropped from every compacted context
+        self.boilerplate = frozenset()
+        self._content_contexts = OrderedDict()  # content hash -> compacted context
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _load_if_changed(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return
+        df = pd.read_csv(self.path, encoding="utf-8", on_bad_lines="skip")
+        by_command_id, by_question_id = {}, {}
+        for _, row in df.iterrows():
+            question = Question(row)
+            # the first row wins for duplicated IDs, like the per-call lookups did
+            by_command_id.setdefault(question.question_command_id.lower(), question)
+            by_question_id.setdefault(question.question_id, question)
+        boilerplate = find_boilerplate([q.question_content for q in by_command_id.values()])
+        for command_id, context in build_question_contexts(list(by_command_id.values()), boilerplate).items():
+            by_command_id[command_id].question_context = context.text
+            by_command_id[command_id].question_context_tokens = context.tokens
+        self.by_command_id, self.by_question_id = by_command_id, by_question_id
+        self.by_content_hash = {_content_hash(q.question_content): q for q in by_command_id.values()}
+        self.boilerplate = boilerplate
+        self._content_contexts = OrderedDict()
+        self._mtime = mtime
+        logger.info(f"Loaded {len(by_command_id)} questions from {self.path}")
+        for listener in _reload_listeners:
+            listener(self)
+
+    def _ensure_loaded(self):
+        with self._lock:
+            self._load_if_changed()
+
+    @property
+    def version(self):
+        """Changes whenever the catalog is re-read, for caches derived from it."""
+        self._ensure_loaded()
+        return self._mtime
+
+    def questions(self):
+        self._ensure_loaded()
+        return list(self.by_command_id.values())
+
+    def get(self, question_command_id):
+        """Question with exactly this question_command_id (case-insensitive), or None."""
+        self._ensure_loaded()
+        return self.by_command_id.get(str(question_command_id).strip().lower())
+
+    def get_by_question_id(self, question_id):
+        self._ensure_loaded()
+        return self.by_question_id.get(str(question_id).strip())
+
+    def context_for_content(self, content):
+        """
+        Compact context for question content that arrives without a question ID: the
+        precompiled context of the catalog question with this content, else the content
+        compacted with the catalog's boilerplate, once per distinct content.
+        """
+        self._ensure_loaded()
+        key = _content_hash(content)
+        question = self.by_content_hash.get(key)
+        if question is not None:
+            return question.question_context
+        with self._lock:
+            context = self._content_contexts.get(key)
+            if context is not None:
+                self._content_contexts.move_to_end(key)
+                return context
+        context = compact_question_content(content, self.boilerplate)
+        with self._lock:
+            self._content_contexts[key] = context
+            while len(self._content_contexts) > CONTENT_CONTEXT_CACHE_SIZE:
+                self._content_contexts.popitem(last=False)
+        return context
+
+    def find(self, zip_filename):
+        """
+        Question for an uploaded zip name: an exact question_command_id match, else
+        the first command ID containing the name, as the CSV lookup used to do.
+        """
+        question = self.get(zip_filename)
+        if question is not None:
+            return question
+        needle = str(zip_filename).strip().lower()
+        return next((q for key, q in self.by_command_id.items() if needle and needle in key), None)
+
+
+_reload_listeners = []
+
+
+def add_reload_listener(fn):
+    """Call fn(catalog) every time the catalog is (re)loaded, e.g. to precompute per-question data."""
+    _reload_listeners.append(fn)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = QuestionCatalog()
+        return _catalog
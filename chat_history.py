@@ -0,0 +1,117 @@
+# chat_history.py
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Hard ceiling on the estimated prompt size of a single multi-turn call
+MAX_PROMPT_TOKENS = int(os.getenv("AGENT_MAX_PROMPT_TOKENS", "24000"))
+# Number of most recent (user, assistant) turns that are always sent verbatim
+KEEP_RECENT_TURNS = int(os.getenv("AGENT_KEEP_RECENT_TURNS", "2"))
+
+SUMMARY_PREVIEW_CHARS = 200
+TRUNCATION_MARKER = "... [truncated to fit the context limit]"
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) - good enough for budgeting."""
+    if isinstance(text, list):
+        text = " ".join(part.get("text", "") for part in text if isinstance(part, dict))
+    return len(text) // 4 + 1
+
+
+def truncate_to_fit(content, overflow_tokens):
+    """content shortened by about overflow_tokens, marked as cut; empty when nothing of it fits."""
+    keep_chars = len(content) - overflow_tokens * 4 - len(TRUNCATION_MARKER)
+    return f"{content[:keep_chars]}{TRUNCATION_MARKER}" if keep_chars > 0 else ""
+
+
+def summarize_observation(content):
+    """Default compact form of an aged-out message: a short preview plus its size."""
+    if len(content) <= SUMMARY_PREVIEW_CHARS:
+        return content
+    return f"{content[:SUMMARY_PREVIEW_CHARS]}... [{len(content) - SUMMARY_PREVIEW_CHARS} chars omitted]"
+
+
+class ChatHistory:
+    """
+    Keeps the prompt of a multi-turn chat bounded.
+
+    The system prompt and the first user message (the task) are always sent
+    verbatim, as are the most recent turns. Older messages are replaced by
+    their summaries. If the prompt is still over the ceiling the recent turns
+    are compacted too, then the oldest turns are dropped, the recent messages
+    are truncated oldest first and, when the task alone is over the ceiling,
+    the end of the task (the repo state) is cut as well. Whenever the system
+    prompt fits, the prompt stays within max_prompt_tokens.
+    """
+
+    def __init__(self, system_prompt, keep_recent_turns=KEEP_RECENT_TURNS, max_prompt_tokens=MAX_PROMPT_TOKENS):
+        self.system_prompt = system_prompt
+        self.keep_recent_turns = keep_recent_turns
+        self.max_prompt_tokens = max_prompt_tokens
+        self.turns = []  # [{"role", "content", "summary"}]
+        self.prompt_sizes = []
+
+    def add_user(self, content, summary=None):
+        self.turns.append({"role": "user", "content": content,
+                           "summary": summary if summary is not None else summarize_observation(content)})
+
+    def add_assistant(self, content, summary=None):
+        self.turns.append({"role": "assistant", "content": content,
+                           "summary": summary if summary is not None else summarize_observation(content)})
+
+    def _recent_start(self):
+        """Index of the first turn that is kept verbatim."""
+        # every turn is a user message followed by the assistant reply
+        return max(1, len(self.turns) - (2 * self.keep_recent_turns + 1))
+
+    def build_messages(self):
+        """Messages for the next call, compacted to fit max_prompt_tokens."""
+        if not self.turns:
+            return [{"role": "system", "content": self.system_prompt}]
+
+        recent_start = self._recent_start()
+        head = self.turns[0]
+        head_content = head["content"]
+        middle = [{"role": t["role"], "content": t["summary"]} for t in self.turns[1:recent_start]]
+        recent = [{"role": t["role"], "content": t["content"]} for t in self.turns[recent_start:]]
+
+        def total():
+            return estimate_tokens(self.system_prompt) + estimate_tokens(head_content) + \
+                sum(estimate_tokens(m["content"]) for m in middle + recent)
+
+        # compact the recent turns as well, oldest first, keeping the newest message
+        for message, turn in zip(recent[:-1], self.turns[recent_start:-1]):
+            if total() <= self.max_prompt_tokens:
+                break
+            message["content"] = turn["summary"]
+        # then drop the oldest compacted turns in (assistant, user) pairs
+        while middle and total() > self.max_prompt_tokens:
+            del middle[:2]
+        # then cut the recent messages down to whatever budget is left, oldest first; the ones
+        # cut away entirely are dropped, except the newest, which the reply has to answer
+        for message in list(recent):
+            overflow = total() - self.max_prompt_tokens
+            if overflow <= 0:
+                break
+            if isinstance(message["content"], str):
+                message["content"] = truncate_to_fit(message["content"], overflow)
+                if not message["content"] and message is not recent[-1]:
+                    recent.remove(message)
+        # the task is last: when it alone exceeds the budget, keep its start and cut the repo state at the end
+        overflow = total() - self.max_prompt_tokens
+        if overflow > 0 and isinstance(head_content, str):
+            head_content = truncate_to_fit(head_content, overflow)
+            logger.warning(f"Chat task cut to {len(head_content)} characters to fit {self.max_prompt_tokens} prompt tokens")
+
+        messages = [{"role": "system", "content": self.system_prompt},
+                    {"role": head["role"], "content": head_content}] + middle + recent
+        size = sum(estimate_tokens(m["content"]) for m in messages)
+        # the task and the newest message cost a token each even when cut away entirely
+        if size > self.max_prompt_tokens and estimate_tokens(self.system_prompt) + 2 <= self.max_prompt_tokens:
+            logger.error(f"Chat prompt of ~{size} tokens is over the {self.max_prompt_tokens} token ceiling")
+        self.prompt_sizes.append(size)
+        logger.info(f"Chat step {len(self.prompt_sizes)}: ~{size} prompt tokens across {len(messages)} messages")
+        return messages
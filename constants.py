@@ -0,0 +1,54 @@
+# constants.py
+
+# Query categories emitted by the classification step and dispatched on by QRBot.
+TEST_CASE_FAILURES = "Test case failures"
+UNEXPECTED_OUTPUT = "Unexpected output"
+MISTAKES_EXPLANATION = "Mistakes Explanation"
+FIX_SPECIFIC_ERRORS = "Fix specific errors"
+CODE_PUBLISHING_ISSUE = "Code publishing issue"
+IDE_ISSUE = "IDE issue"
+CONCEPTUAL_DOUBTS = "Conceptual doubts"
+PROBLEM_SOLVING_APPROACH = "Problem solving approach"
+IMPLEMENTATION_GUIDANCE = "Implementation guidance"
+OTHER = "other"
+
+QUERY_CATEGORIES = [
+    TEST_CASE_FAILURES,
+    UNEXPECTED_OUTPUT,
+    MISTAKES_EXPLANATION,
+    FIX_SPECIFIC_ERRORS,
+    CODE_PUBLISHING_ISSUE,
+    IDE_ISSUE,
+    CONCEPTUAL_DOUBTS,
+    PROBLEM_SOLVING_APPROACH,
+    IMPLEMENTATION_GUIDANCE,
+    OTHER,
+]
+
+# One-letter codes the LLM classifier answers with, to keep its output to a handful of tokens.
+CATEGORY_CODES = {
+    "T": TEST_CASE_FAILURES,
+    "U": UNEXPECTED_OUTPUT,
+    "M": MISTAKES_EXPLANATION,
+    "F": FIX_SPECIFIC_ERRORS,
+    "P": CODE_PUBLISHING_ISSUE,
+    "I": IDE_ISSUE,
+    "C": CONCEPTUAL_DOUBTS,
+    "S": PROBLEM_SOLVING_APPROACH,
+    "G": IMPLEMENTATION_GUIDANCE,
+    "O": OTHER,
+}
+
+# Categories whose answer needs the submitted code extracted and copied into an IDE container.
+CONTAINER_BOUND_CATEGORIES = [
+    TEST_CASE_FAILURES,
+    UNEXPECTED_OUTPUT,
+    MISTAKES_EXPLANATION,
+    FIX_SPECIFIC_ERRORS,
+    IMPLEMENTATION_GUIDANCE,
+]
+
+
+def is_container_bound(category):
+    """QRBot matches categories by substring, so do the same here."""
+    return any(c in category for c in CONTAINER_BOUND_CATEGORIES)
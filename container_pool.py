@@ -0,0 +1,57 @@
+# container_pool.py
+
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Comma separated IDs/names of the IDE containers that can run test suites
+IDE_CONTAINER_IDS = os.getenv("IDE_CONTAINER_IDS", "ccbp-ide")
+
+
+class ContainerPool:
+    """Hands out IDE containers so that concurrent test runs never share one."""
+
+    def __init__(self, container_ids):
+        self.container_ids = list(container_ids)
+        self._available = queue.Queue()
+        for container_id in self.container_ids:
+            self._available.put(container_id)
+
+    @property
+    def size(self):
+        return len(self.container_ids)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """
+        Reserve a container for the duration of the with-block.
+
+        Raises:
+            TimeoutError: If no container frees up within timeout seconds.
+        """
+        try:
+            container_id = self._available.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No IDE container became available within {timeout}s")
+        logger.info(f"Leased container {container_id}")
+        try:
+            yield container_id
+        finally:
+            self._available.put(container_id)
+            logger.info(f"Released container {container_id}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_container_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ContainerPool(c.strip() for c in IDE_CONTAINER_IDS.split(",") if c.strip())
+        return _pool
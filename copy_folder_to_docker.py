@@ -7,49 +7,44 @@ import subprocess
 import shutil
 import time
 from dotenv import load_dotenv
+from metrics import timed
+from catalog import get_catalog
+from deadline import DeadlineExceeded, budget, run_command
 
 # Load environment variables
 load_dotenv()
 
+@timed("wait_for_docker")
 def wait_for_docker(timeout=30):
     """Wait for Docker to become available"""
+    timeout = budget("wait_for_docker", timeout)
     start_time = time.time()
     while time.time() - start_time < timeout:
         try:
-            result = subprocess.run('docker ps', shell=True, capture_output=True, text=True)
+            result = run_command('docker ps', "wait_for_docker", timeout=timeout, capture_output=True, text=True)
             if result.returncode == 0:
                 return True
             time.sleep(2)
+        except DeadlineExceeded:
+            raise
         except Exception:
             time.sleep(2)
     return False
 
 def get_question_details(question_id, column_name):
-    csv_file_path = 'commands.csv' 
-    
     try:
-        df = pd.read_csv(csv_file_path)
-        if column_name not in df.columns:
-            print(f"Column '{column_name}' not found in the CSV.")
-            return None
-            
-        # Clean the data
-        df['question_command_id'] = df['question_command_id'].str.strip()
-        
-        # Try both question_id and question_command_id columns
-        if 'question_command_id' in df.columns:
-            result = df[df['question_command_id'] == question_id]
-        else:
-            result = df[df['question_id'] == question_id]
-        
-        if result.empty:
+        question = get_catalog().get(question_id)
+        if question is None:
             print(f"Question ID '{question_id}' not found in the CSV.")
             return None
-            
-        return str(result[column_name].iloc[0])
+        value = question.get(column_name)
+        if value is None:
+            print(f"Column '{column_name}' not found in the CSV.")
+            return None
+        return value
     
     except FileNotFoundError:
-        print(f"CSV file '{csv_file_path}' not found in directory: {os.getcwd()}")
+        print(f"CSV file '{get_catalog().path}' not found in directory: {os.getcwd()}")
         return None
     except pd.errors.EmptyDataError:
         print("The CSV file is empty.")
@@ -69,6 +64,7 @@ def check_and_delete_folder(folder_path):
             return False
     return True  # Return True if folder doesn't exist, as that's what we want
 
+@timed("zip_extract")
 def extract_zip(zip_path, output_folder="./workspace"):
     try:
         # Create output folder if it doesn't exist
@@ -85,6 +81,7 @@ def extract_zip(zip_path, output_folder="./workspace"):
         print(f"An error occurred while extracting ZIP: {e}")
         return None
 
+@timed("docker_copy")
 def copy_folder_to_docker(container_id, input_folder, output_folder):
     try:
         # Wait for Docker to become available
@@ -97,26 +94,26 @@ def copy_folder_to_docker(container_id, input_folder, output_folder):
         print(f"output_folder : {output_folder}")
         
         # Check if container exists and is running
-        check_container = subprocess.run(f"docker container inspect {container_id}", 
-                                      shell=True, capture_output=True, text=True)
+        check_container = run_command(f"docker container inspect {container_id}", "docker_copy",
+                                      capture_output=True, text=True)
         if check_container.returncode != 0:
             raise Exception(f"Container '{container_id}' does not exist or is not accessible")
         
         # Try creating directory with root user
         mkdir_cmd = f"docker exec --user root {container_id} sh -c 'mkdir -p {output_folder} && chmod -R 777 {output_folder}'"
-        result = subprocess.run(mkdir_cmd, shell=True, capture_output=True, text=True)
+        result = run_command(mkdir_cmd, "docker_copy", capture_output=True, text=True)
         
         if result.returncode != 0:
             print(f"Warning: mkdir command failed: {result.stderr}")
             # Try alternative approach
             alt_cmd = f"docker exec {container_id} sh -c 'mkdir -p {output_folder} && chmod -R 777 {output_folder}'"
-            alt_result = subprocess.run(alt_cmd, shell=True, capture_output=True, text=True)
+            alt_result = run_command(alt_cmd, "docker_copy", capture_output=True, text=True)
             if alt_result.returncode != 0:
                 raise Exception(f"Failed to create directory: {alt_result.stderr}")
         
         # Copy files to Docker container
         copy_cmd = f"docker cp {input_folder}/. {container_id}:{output_folder}"
-        copy_result = subprocess.run(copy_cmd, shell=True, capture_output=True, text=True)
+        copy_result = run_command(copy_cmd, "docker_copy", capture_output=True, text=True)
         
         if copy_result.returncode != 0:
             raise Exception(f"Copy failed: {copy_result.stderr}")
@@ -127,6 +124,7 @@ def copy_folder_to_docker(container_id, input_folder, output_folder):
         print(f"Error in copy_folder_to_docker: {str(e)}")
         raise
 
+@timed("prepare_docker")
 def prepare_docker_environment(question_id, zip_path, container_id):
     try:
         # Wait for Docker to become available
@@ -159,6 +157,8 @@ def prepare_docker_environment(question_id, zip_path, container_id):
         try:
             copy_folder_to_docker(container_id, output_folder, folder)
             print("Docker environment prepared successfully")
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Failed to copy folder to Docker: {e}")
             return
@@ -0,0 +1,98 @@
+# deadline.py
+
+import contextvars
+import logging
+import os
+import subprocess
+import time
+from contextlib import contextmanager
+
+from metrics import count
+
+logger = logging.getLogger(__name__)
+
+# Total time budget of one /process request or job, from the endpoint to the answer
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "150"))
+
+_current_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage starts, or is still running, after the request deadline."""
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+@contextmanager
+def deadline_scope(seconds=REQUEST_DEADLINE_SECONDS):
+    """
+    Give the enclosed work a deadline. Nested scopes can only tighten an
+    outer deadline, never extend it.
+    """
+    outer = _current_deadline.get()
+    deadline = Deadline(seconds)
+    if outer is not None and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline():
+    return _current_deadline.get()
+
+
+def check_deadline(stage):
+    """
+    Raises:
+        DeadlineExceeded: If the current request has no budget left for stage.
+    """
+    deadline = _current_deadline.get()
+    if deadline is not None and deadline.expired():
+        count("deadline_exceeded", stage=stage)
+        logger.warning(f"Deadline of {deadline.seconds}s exceeded before {stage}")
+        raise DeadlineExceeded(f"Request deadline exceeded before {stage}")
+
+
+def budget(stage, default=None):
+    """
+    Timeout in seconds for the next blocking call of stage: its usual timeout
+    capped by what is left of the request deadline. None means no limit.
+
+    Raises:
+        DeadlineExceeded: If nothing is left.
+    """
+    check_deadline(stage)
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline.remaining()
+    return remaining if default is None else min(default, remaining)
+
+
+def run_command(command, stage, timeout=None, **kwargs):
+    """
+    subprocess.run(command, shell=True) within the request budget. The
+    command is killed when the budget runs out.
+
+    Raises:
+        DeadlineExceeded: If the deadline expired before or during the command.
+        subprocess.TimeoutExpired: If only the stage's own timeout expired.
+    """
+    try:
+        return subprocess.run(command, shell=True, timeout=budget(stage, timeout), **kwargs)
+    except subprocess.TimeoutExpired:
+        check_deadline(stage)
+        raise
@@ -0,0 +1,259 @@
+# evaluate.py
+"""
+Bulk evaluation of the bot over a corpus of submissions.
+
+Runs every (zip, query, question ID) item through the same pipeline as
+/process, in a pool of processes with a pool of threads each, and appends
+one JSON line per item (response, status, category, per-stage timings) to
+the output file. Items already in the output are skipped, so an interrupted
+run resumes where it stopped.
+
+    python evaluate.py --manifest corpus.jsonl --output results.jsonl --processes 4 --threads 4
+    python evaluate.py --dir submissions/ --output results.jsonl
+
+A manifest line is {"zip": "path/RJSCPYQN94.zip", "query": "...", "question_id": "RJSCPYQN94"};
+question_id defaults to the zip file name and an optional "id" names the item. In a
+directory, every <name>.zip is paired with the query in <name>.txt (or .html).
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+
+from metrics import percentile
+
+# Settings the pipeline reads relative to the working directory; workers run in their own
+# directories (the pipeline recreates ./workspace), so these are pinned to absolute paths first
+SHARED_PATH_SETTINGS = (
+    ("CATALOG_PATH", "commands.csv"),
+    ("MODEL_ROUTING_PATH", "model_routing.json"),
+    ("FAST_PATH_MODEL_PATH", "query_classifier_model.json"),
+    ("STARTER_SNAPSHOT_DIR", "starter_snapshots"),
+    ("FAILURE_SIGNATURES_PATH", "failure_signatures.json"),
+    ("SUBMISSION_DB_PATH", "submissions.db"),
+    ("RESPONSE_DB_PATH", "responses.db"),
+    ("TEST_RESULTS_LOG_PATH", ""),
+    ("CLASSIFICATION_LOG_PATH", ""),
+)
+
+
+def item_id(item):
+    if item.get("id"):
+        return str(item["id"])
+    digest = hashlib.sha256(f"{item['zip']}\0{item['query']}\0{item['question_id']}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def load_manifest(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_directory(path):
+    items = []
+    for name in sorted(os.listdir(path)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() != ".zip":
+            continue
+        for query_ext in (".txt", ".html"):
+            query_path = os.path.join(path, stem + query_ext)
+            if os.path.isfile(query_path):
+                with open(query_path, "r", encoding="utf-8") as f:
+                    items.append({"zip": os.path.join(path, name), "query": f.read()})
+                break
+        else:
+            print(f"Skipping {name}: no {stem}.txt or {stem}.html query")
+    return items
+
+
+def completed_ids(output_path):
+    """IDs already in the output file; a line cut short by a crash is ignored."""
+    done = set()
+    if not os.path.isfile(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+# ---------------------- Worker side ----------------------
+
+def _init_worker(work_dir):
+    """Per process: own working directory, then import the pipeline once so catalog, caches and clients are shared."""
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+    # no trace files unless asked for
+    os.environ.setdefault("TRACE_LOG_DIR", "")
+    import main  # noqa: F401 - builds the prompt registry and section index
+
+
+def _stage_timings(trace):
+    stages = {}
+    for span in trace["spans"]:
+        stage = f"{span['stage']}:{span['llm_stage']}" if span.get("llm_stage") else span["stage"]
+        stages[stage] = round(stages.get(stage, 0.0) + span["duration"], 6)
+    return stages
+
+
+def evaluate_item(item, deadline_seconds=0):
+    """
+    One item through run_pipeline, as /process runs it, minus the response
+    store and coalescing. With deadline_seconds the item gets a request
+    deadline like /process, and an answer cut short by it is recorded with
+    status "deadline_exceeded" rather than as a <mentor_required> escalation.
+    """
+    from main import run_pipeline
+    from metrics import request_scope, get_query_category
+    from deadline import deadline_scope, DeadlineExceeded
+    from tracing import trace_request
+
+    record = {"id": item["id"], "zip": item["zip"], "question_id": item["question_id"], "query": item["query"]}
+    start = time.perf_counter()
+    scope = deadline_scope(deadline_seconds) if deadline_seconds else nullcontext()
+    with request_scope(), scope as deadline, trace_request("evaluate", item["id"]) as trace:
+        try:
+            body, status = run_pipeline(item["zip"], item["question_id"], item["query"], reject_when_full=False)
+            record.update(status=status, response=body.get("response"), error=body.get("error"))
+        except DeadlineExceeded:
+            record.update(status=200, response="<mentor_required>", error=None)
+        except Exception as e:
+            record.update(status=None, response=None, error=f"{type(e).__name__}: {str(e)}")
+        if deadline is not None and deadline.expired() and record["response"] == "<mentor_required>":
+            record["status"] = "deadline_exceeded"
+        record["category"] = get_query_category()
+        trace.set(status=record["status"])
+    record["duration"] = round(time.perf_counter() - start, 6)
+    record["stages"] = _stage_timings(trace.to_dict())
+    return record
+
+
+def _run_items(items, threads, deadline_seconds, emit):
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="evaluate") as pool:
+        for future in as_completed([pool.submit(evaluate_item, item, deadline_seconds) for item in items]):
+            emit(future.result())
+
+
+def _run_shard(work_dir, items, threads, deadline_seconds, results):
+    _init_worker(work_dir)
+    _run_items(items, threads, deadline_seconds, results.put)
+
+
+# ---------------------- Driver ----------------------
+
+def print_summary(output_path):
+    records = []
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    statuses = {}
+    for record in records:
+        statuses[str(record["status"])] = statuses.get(str(record["status"]), 0) + 1
+    print(f"Items: {len(records)}  statuses: {statuses}")
+    durations = [r["duration"] for r in records]
+    if durations:
+        print(f"Duration p50 {percentile(durations, 50):.3f}s  p95 {percentile(durations, 95):.3f}s")
+    stages = {}
+    for record in records:
+        for stage, seconds in record["stages"].items():
+            stages.setdefault(stage, []).append(seconds)
+    print(f"{'stage':<40} {'count':>7} {'p50 (s)':>10} {'p95 (s)':>10}")
+    for stage, values in sorted(stages.items(), key=lambda item: percentile(item[1], 95), reverse=True):
+        print(f"{stage:<40} {len(values):>7} {percentile(values, 50):>10.3f} {percentile(values, 95):>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot over a corpus of (zip, query, question ID) items")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="JSONL of {zip, query, question_id}")
+    source.add_argument("--dir", help="directory of <name>.zip files with <name>.txt queries")
+    parser.add_argument("--output", required=True, help="JSONL results; items already in it are skipped")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=4, help="items in flight per process")
+    parser.add_argument("--deadline", type=float, default=0,
+                        help="per-item request deadline in seconds, as REQUEST_DEADLINE_SECONDS for /process "
+                             "(default: none, items waiting for the docker lane would otherwise expire)")
+    parser.add_argument("--work-dir", help="where the workers' ./workspace directories go (default: a temp dir)")
+    parser.add_argument("--restart", action="store_true", help="discard the existing output instead of resuming")
+    args = parser.parse_args()
+
+    items = load_manifest(args.manifest) if args.manifest else load_directory(args.dir)
+    for item in items:
+        item["zip"] = os.path.abspath(item["zip"])
+        item["question_id"] = item.get("question_id") or os.path.splitext(os.path.basename(item["zip"]))[0]
+        item["id"] = item_id(item)
+    for name, default in SHARED_PATH_SETTINGS:
+        if os.getenv(name, default):
+            os.environ[name] = os.path.abspath(os.getenv(name, default))
+
+    output_path = os.path.abspath(args.output)
+    if args.restart and os.path.exists(output_path):
+        os.remove(output_path)
+    done = completed_ids(output_path)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"{len(items)} items, {len(items) - len(pending)} already done, {len(pending)} to run")
+
+    work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix="evaluate-"))
+    start = time.perf_counter()
+    finished = 0
+    with open(output_path, "a", encoding="utf-8") as out:
+        def emit(record):
+            nonlocal finished
+            # one flushed line per item is the checkpoint
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            finished += 1
+            if finished % 10 == 0 or finished == len(pending):
+                print(f"{finished}/{len(pending)} done, {time.perf_counter() - start:.1f}s")
+
+        if args.processes <= 1:
+            _init_worker(os.path.join(work_dir, "worker-0"))
+            _run_items(pending, args.threads, args.deadline, emit)
+        else:
+            # spawn: workers import the pipeline themselves rather than inheriting threads and sockets
+            context = multiprocessing.get_context("spawn")
+            with context.Manager() as manager:
+                results = manager.Queue()
+                shards = [pending[i::args.processes] for i in range(args.processes)]
+                workers = [context.Process(target=_run_shard,
+                                           args=(os.path.join(work_dir, f"worker-{i}"), shard, args.threads,
+                                                 args.deadline, results))
+                           for i, shard in enumerate(shards) if shard]
+                for worker in workers:
+                    worker.start()
+                while finished < len(pending):
+                    try:
+                        emit(results.get(timeout=1))
+                    except queue.Empty:
+                        # a put() returns once the manager has the record, so with every worker
+                        # gone and the queue empty nothing more is coming
+                        if not any(worker.is_alive() for worker in workers):
+                            break
+                for worker in workers:
+                    worker.join()
+                failed = [worker.exitcode for worker in workers if worker.exitcode]
+                if failed:
+                    print(f"Worker processes exited with codes {failed}")
+
+    print_summary(output_path)
+    if finished < len(pending):
+        print(f"{len(pending) - finished} items did not finish; rerun the same command to resume")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# failure_signatures.py
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from catalog import get_catalog
+from metrics import count
+
+logger = logging.getLogger(__name__)
+
+# JSONL file each test run's outcome is appended to for the offline analysis; empty disables logging
+TEST_RESULTS_LOG_PATH = os.getenv("TEST_RESULTS_LOG_PATH", "")
+# Explanations generated by `python failure_signatures.py analyze`; a missing file disables lookups
+FAILURE_SIGNATURES_PATH = os.getenv("FAILURE_SIGNATURES_PATH", "failure_signatures.json")
+# A failing-test combination needs this many submissions and this share of a question's failing runs
+FAILURE_SIGNATURE_MIN_COUNT = int(os.getenv("FAILURE_SIGNATURE_MIN_COUNT", "5"))
+FAILURE_SIGNATURE_MIN_SHARE = float(os.getenv("FAILURE_SIGNATURE_MIN_SHARE", "0.05"))
+FAILURE_SIGNATURE_TOP_K = int(os.getenv("FAILURE_SIGNATURE_TOP_K", "10"))
+
+_log_lock = threading.Lock()
+
+
+def _test_id(test):
+    return str(test.get("id") if isinstance(test, dict) else test).strip().upper()
+
+
+def signature_key(failing_ids):
+    """Order-independent key of a failing-test combination."""
+    return ",".join(sorted({str(t).strip().upper() for t in failing_ids}))
+
+
+def log_test_results(question_id, results):
+    """Append one test run's outcome (extract_test_results output) for offline analysis."""
+    if not TEST_RESULTS_LOG_PATH or not results:
+        return
+    try:
+        catalog = get_catalog()
+        question = catalog.get_by_question_id(question_id) or catalog.get(question_id)
+        record = {
+            "question_command_id": question.question_command_id if question else str(question_id),
+            "passed": [_test_id(t) for t in results.get("passed", [])],
+            "failed": [_test_id(t) for t in results.get("failed", [])],
+            "logged_at": time.time(),
+        }
+        with _log_lock, open(TEST_RESULTS_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        logger.warning(f"Failed to log test results: {str(e)}")
+
+
+# ---------------------- Offline analysis ----------------------
+
+def load_test_results(path):
+    return pd.read_json(path, lines=True)
+
+
+def failure_matrix(runs):
+    """
+    (tests, matrix) for one question's runs: matrix[i, j] is True when run i
+    failed tests[j]. Tests that never ran in a submission count as passed.
+    """
+    tests = sorted({t for failed in runs["failed"] for t in failed} | {t for passed in runs["passed"] for t in passed})
+    column = {t: j for j, t in enumerate(tests)}
+    matrix = np.zeros((len(runs), len(tests)), dtype=bool)
+    rows = [i for i, failed in enumerate(runs["failed"]) for _ in failed]
+    cols = [column[t] for failed in runs["failed"] for t in failed]
+    matrix[rows, cols] = True
+    return tests, matrix
+
+
+def frequent_signatures(tests, matrix, min_count=FAILURE_SIGNATURE_MIN_COUNT,
+                        min_share=FAILURE_SIGNATURE_MIN_SHARE, top_k=FAILURE_SIGNATURE_TOP_K):
+    """[(failing test IDs, count, share of failing runs)] most frequent first."""
+    failing_runs = matrix[matrix.any(axis=1)]
+    if not len(failing_runs):
+        return []
+    signatures, counts = np.unique(failing_runs, axis=0, return_counts=True)
+    shares = counts / len(failing_runs)
+    keep = (counts >= min_count) & (shares >= min_share)
+    order = np.argsort(-counts[keep], kind="stable")[:top_k]
+    tests = np.asarray(tests)
+    return [(list(tests[row]), int(n), float(share))
+            for row, n, share in zip(signatures[keep][order], counts[keep][order], shares[keep][order])]
+
+
+def analyze(results, **thresholds):
+    """{question_command_id: {"runs", "failure_rate" per test, "signatures"}} over logged test runs."""
+    report = {}
+    for question_command_id, runs in results.groupby("question_command_id"):
+        runs = runs.reset_index(drop=True)
+        tests, matrix = failure_matrix(runs)
+        report[question_command_id] = {
+            "runs": len(runs),
+            "failure_rate": dict(zip(tests, np.round(matrix.mean(axis=0), 4).tolist())) if len(tests) else {},
+            "signatures": [{"failing": failing, "count": n, "share": round(share, 4)}
+                           for failing, n, share in frequent_signatures(tests, matrix, **thresholds)],
+        }
+    return report
+
+
+def _fallback_explanation(failing_ids, tests):
+    lines = ["Hi,", "", "These test cases are failing:", ""]
+    # tests the catalog cannot resolve (no test case list for the question) are listed by ID
+    lines += [f"- {test.id}: {test.title}" for test in tests] if tests else [f"- {test_id}" for test_id in failing_ids]
+    lines += ["", "Compare each of them with the `Important Note` section of the question and check that the "
+              "elements, texts and routes they look for are rendered exactly as described.", "",
+              "Hope it solved you query, Feel free to reach out to us if you have any other questions. "
+              "Mark the discussion as clarified if your issue is resolved."]
+    return "\n".join(lines)
+
+
+def generate_explanations(report, use_llm=True):
+    """Fill in an explanation for every signature, from the LLM or a plain template."""
+    # imported here so the analysis itself runs without LLM credentials
+    from helpers import llm_call
+    from prompt_registry import get_prompt_registry
+    import model_routing
+
+    for question_command_id, entry in report.items():
+        question = get_catalog().get(question_command_id)
+        for signature in entry["signatures"]:
+            tests = [question.test_cases.lookup(t) for t in signature["failing"]] if question else []
+            tests = [t for t in tests if t is not None]
+            explanation = None
+            if use_llm and question is not None:
+                prompt = get_prompt_registry().get("get_failure_signature_explanation_prompt")
+                reply = llm_call(prompt.text,
+                                 f"Question Details: {question.question_context}, "
+                                 f"Failing Tests: {question.test_cases.render(tests)}",
+                                 prompt_name=prompt.name, stage=model_routing.FAILURE_SIGNATURES)
+                if not reply.startswith("Error"):
+                    explanation = reply
+            signature["explanation"] = explanation or _fallback_explanation(signature["failing"], tests)
+    return report
+
+
+# ---------------------- Request time ----------------------
+
+class FailureSignatures:
+    """Pre-generated explanations by question and failing-test combination."""
+
+    def __init__(self, report):
+        self.explanations = {
+            (question_command_id.lower(), signature_key(s["failing"])): s["explanation"]
+            for question_command_id, entry in report.items()
+            for s in entry.get("signatures", []) if s.get("explanation")
+        }
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def lookup(self, question_command_id, failing_ids):
+        """The explanation for exactly this failing-test combination, or None."""
+        if not failing_ids:
+            return None
+        explanation = self.explanations.get((str(question_command_id).strip().lower(), signature_key(failing_ids)))
+        count("failure_signature", outcome="hit" if explanation else "miss")
+        return explanation
+
+
+_signatures = None
+_signatures_lock = threading.Lock()
+
+
+def get_failure_signatures():
+    """The loaded explanations, or None when FAILURE_SIGNATURES_PATH does not exist."""
+    global _signatures
+    with _signatures_lock:
+        if _signatures is None and os.path.isfile(FAILURE_SIGNATURES_PATH):
+            _signatures = FailureSignatures.load(FAILURE_SIGNATURES_PATH)
+            logger.info(f"Loaded {len(_signatures.explanations)} failure signature explanations")
+        return _signatures
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "analyze":
+        print("Usage: python failure_signatures.py analyze <test_results.jsonl> [failure_signatures.json] [--no-llm]")
+        sys.exit(1)
+
+    args = [a for a in sys.argv[2:] if a != "--no-llm"]
+    output_path = args[1] if len(args) > 1 else FAILURE_SIGNATURES_PATH
+    report = analyze(load_test_results(args[0]))
+    generate_explanations(report, use_llm="--no-llm" not in sys.argv)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    signatures = sum(len(entry["signatures"]) for entry in report.values())
+    print(f"Questions: {len(report)}")
+    print(f"Signatures with explanations: {signatures}, saved to {output_path}")
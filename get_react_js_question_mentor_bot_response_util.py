@@ -11,6 +11,19 @@ from mentor_bot_prompts_config import \
     SPECIFIC_ERRORS_QR_V0_PROMPT, PUBLISHING_RELATED_QUERY_SYSTEM_PROMPT, \
     IDE_RELATED_QUERIES_SYSTEM_PROMPT, CONCEPTUAL_DOUBT_PROMPT, \
     IMPLEMENTATION_GUIDANCE_PROMPT, DEFAULT_RESPONSE
+from llm_telemetry import LLMCallRecord, register_prompt_names
+from catalog import get_catalog
+
+register_prompt_names({
+    "QUERY_CLASSIFICATION_PROMPT": QUERY_CLASSIFICATION_PROMPT,
+    "TEST_CASES_QR_V00_PROMPT": TEST_CASES_QR_V00_PROMPT,
+    "SPECIFIC_ERRORS_QR_V0_PROMPT": SPECIFIC_ERRORS_QR_V0_PROMPT,
+    "PUBLISHING_RELATED_QUERY_SYSTEM_PROMPT":
+        PUBLISHING_RELATED_QUERY_SYSTEM_PROMPT,
+    "IDE_RELATED_QUERIES_SYSTEM_PROMPT": IDE_RELATED_QUERIES_SYSTEM_PROMPT,
+    "CONCEPTUAL_DOUBT_PROMPT": CONCEPTUAL_DOUBT_PROMPT,
+    "IMPLEMENTATION_GUIDANCE_PROMPT": IMPLEMENTATION_GUIDANCE_PROMPT,
+})
 
 logger = logging.getLogger(__name__)
 
@@ -79,7 +92,8 @@ class GetAIResponseForReactJsQuestionUtil:
                 f"User Query: {self.query_router.updated_query_context}",
                 bot_config_dto, prompt_vars_dto)
         elif "Implementation guidance" in self.query_category:
-            question_details = bot_config_dto.content
+            question_details = get_catalog().context_for_content(
+                bot_config_dto.content)
             self.repo_state = self._get_user_code_from_zip_file(bot_config_dto)
             prompt = IMPLEMENTATION_GUIDANCE_PROMPT
             user_prompt = \
@@ -306,13 +320,21 @@ def get_ai_response(
     entity_id = prompt_vars_dto.entity_id \
         if prompt_vars_dto else None
 
+    call = LLMCallRecord(None, model_name, messages)
     interactor = AiServiceBaseImplementation()
     service_util = \
         interactor.get_ai_service_util_based_on_service_enum(service_enum)
-    response = \
-        service_util.get_ai_response(
-            messages, model_name, timeout_in_secs, bot_type,
-            retry_attempts_count, discussion_id, entity_id)
+    try:
+        response = \
+            service_util.get_ai_response(
+                messages, model_name, timeout_in_secs, bot_type,
+                retry_attempts_count, discussion_id, entity_id)
+        call.set_usage(response.get("usage"))
+    except Exception as e:
+        call.error = type(e).__name__
+        raise
+    finally:
+        call.finish()
     choices = response.get("choices", [])
     response = choices[0].get('message', {}).get('content') \
         if choices else ""
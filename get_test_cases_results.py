@@ -3,6 +3,10 @@ import json
 import subprocess
 import re 
 import pandas as pd
+from metrics import timed
+from catalog import get_catalog
+from deadline import budget, check_deadline
+from failure_signatures import log_test_results
 
 
 def extract_test_results(test_output):
@@ -30,20 +34,17 @@ def extract_test_results(test_output):
 
 
 def get_question_details(question_id, column_name):
-    csv_file_path = 'commands.csv' 
-    
     try:
-        df = pd.read_csv(csv_file_path)
-        if column_name not in df.columns:
-            return f"Column '{column_name}' not found in the CSV."
-        result = df[df['question_id'] == question_id]
-        
-        if result.empty:
+        question = get_catalog().get_by_question_id(question_id)
+        if question is None:
             return f"Question ID '{question_id}' not found in the CSV."
-        return str(result[column_name].iloc[0])
+        value = question.get(column_name)
+        if value is None:
+            return f"Column '{column_name}' not found in the CSV."
+        return value
     
     except FileNotFoundError:
-        return f"CSV file '{csv_file_path}' not found."
+        return f"CSV file '{get_catalog().path}' not found."
     except pd.errors.EmptyDataError:
         return "The CSV file is empty."
     except Exception as e:
@@ -58,6 +59,7 @@ def remove_ansi_escape_codes(text):
 
 
 
+@timed("test_run")
 def get_test_case_results(question_id):
 
     command = (
@@ -68,19 +70,28 @@ def get_test_case_results(question_id):
     )
     docker_command = f'docker exec -it ccbp-ide /bin/bash -c "{command}"'
     process = subprocess.Popen(docker_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    stdout, stderr = process.communicate()
+    try:
+        stdout, stderr = process.communicate(timeout=budget("test_run"))
+    except subprocess.TimeoutExpired:
+        # jest has no timeout of its own; stop it once the request is out of budget
+        process.kill()
+        process.communicate()
+        check_deadline("test_run")
+        raise
     print(process.returncode)
     print(stdout)
     print(stderr)
 
     if process.returncode == 0:
-        return extract_test_results(remove_ansi_escape_codes(stdout))
+        results = extract_test_results(remove_ansi_escape_codes(stdout))
+        log_test_results(question_id, results)
+        return results
     else:
         print(f"Command failed with return code {process.returncode}")
         print("Command output:", stdout)
         print("Command error:", stderr)
 
-get_test_case_results("4f15b6eb32c443ec921fe9b408ff7c4d")
+
 # if __name__ == "__main__":
 #     if len(sys.argv) != 2:
 #         print("Usage: python script.py <question_id>")
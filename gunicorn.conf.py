@@ -0,0 +1,10 @@
+# gunicorn.conf.py
+# Read by `gunicorn main:app` from the working directory.
+
+
+def post_worker_init(worker):
+    # job workers belong to the serving processes, not to every script that imports main
+    import sys
+    main = sys.modules.get("main")
+    if main is not None and hasattr(main, "start_job_queue"):
+        main.start_job_queue()
@@ -17,6 +17,14 @@ from openai import OpenAI
 import openai
 import tempfile
 from pathlib import Path
+from chat_history import ChatHistory, KEEP_RECENT_TURNS, MAX_PROMPT_TOKENS
+from metrics import timed
+from llm_telemetry import LLMCallRecord
+from deadline import DeadlineExceeded, budget, check_deadline, current_deadline, run_command
+from llm_router import get_llm_router, RequestCancelled
+from model_routing import get_model_routing, StageConfig
+from catalog import get_catalog
+from starter_snapshot import get_starter_snapshot
 
 # Configure logging
 logging.basicConfig(
@@ -28,9 +36,9 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-def get_api_key():
+def get_api_key(env_name="api_key"):
     """Safely retrieve API key from environment variables."""
-    api_key = os.getenv("api_key")
+    api_key = os.getenv(env_name)
     if not api_key:
         logger.error("API key not found in environment variables")
         raise ValueError("API key not configured")
@@ -51,32 +59,114 @@ def parse_html_to_dict(html_text):
         logger.error(f"Error parsing HTML: {str(e)}")
         raise
 
-def llm_call(system_prompt, user_prompt):
-    """Make an API call to the LLM service."""
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_MODEL = "deepseek/deepseek-r1-zero:free"
+# Per-call timeout in seconds, further capped by the request deadline
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+# Retries on timeouts, connection errors, rate limits and 5xx responses
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+_RETRYABLE_ERRORS = (openai.APITimeoutError, openai.APIConnectionError,
+                     openai.RateLimitError, openai.InternalServerError)
+
+def _stream_completion(client, messages, call, cancel_event=None, params=None, timeout=LLM_TIMEOUT, until=None):
+    """
+    Stream the completion so time-to-first-token and usage can be recorded.
+    until(text so far) -> bool ends the stream early once the answer is usable.
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            stream = client.chat.completions.create(
+                model=call.model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **(params or {}),
+            )
+            parts = []
+            deadline = current_deadline()
+            for chunk in stream:
+                if deadline is not None and deadline.expired():
+                    # the client timeout only bounds each read, not the whole stream
+                    stream.close()
+                    check_deadline("llm_call")
+                if cancel_event is not None and cancel_event.is_set():
+                    # the hedged duplicate answered first
+                    stream.close()
+                    raise RequestCancelled()
+                if getattr(chunk, "usage", None):
+                    call.set_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    call.mark_first_token()
+                    parts.append(chunk.choices[0].delta.content)
+                    if until is not None and until("".join(parts)):
+                        stream.close()
+                        break
+            return "".join(parts)
+        except _RETRYABLE_ERRORS as e:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            call.retries += 1
+            logger.warning(f"Retrying LLM call after error: {str(e)}")
+            time.sleep(budget("llm_call", 0.5 * 2 ** attempt))
+            client = client.with_options(timeout=budget("llm_call", timeout))
+
+def _call_endpoint(endpoint, messages, prompt_name, config, stage=None, cancel_event=None, params=None, until=None):
+    """One streamed completion against one router endpoint, recorded in the LLM telemetry."""
+    call = LLMCallRecord(prompt_name, endpoint.model, messages, stage=stage)
     try:
-        logger.info("Calling OpenRouter API...")
-        
-        api_key = get_api_key()
-        
         client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-            timeout=60
-        )
-                    
-        completion = client.chat.completions.create(
-            model="deepseek/deepseek-r1-zero:free",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+            base_url=endpoint.base_url,
+            api_key=get_api_key(endpoint.api_key_env),
+            timeout=budget("llm_call", config.timeout or LLM_TIMEOUT),
+            max_retries=0
         )
-        result = completion.choices[0].message.content
+        return _stream_completion(client, messages, call, cancel_event, {**config.request_params(), **(params or {})},
+                                  config.timeout or LLM_TIMEOUT, until)
+    except RequestCancelled:
+        call.error = "cancelled"
+        raise
+    except DeadlineExceeded:
+        call.error = "deadline"
+        raise
+    except openai.APITimeoutError:
+        call.error = "timeout"
+        raise
+    except openai.APIConnectionError:
+        call.error = "connection"
+        raise
+    except openai.APIError:
+        call.error = "api"
+        raise
+    except Exception as e:
+        call.error = type(e).__name__
+        raise
+    finally:
+        call.finish()
+
+def _chat_completion(messages, log_context="OpenRouter API", prompt_name=None, stage=None, params=None, until=None):
+    """
+    Send a chat completion request and return the reply text or an "Error: ..." string.
+    The model and its parameters come from the model routing entry of stage; params
+    (e.g. max_tokens, stop) override them for this call.
+    """
+    try:
+        logger.info(f"Calling {log_context}...")
+
+        config = StageConfig(model=LLM_MODEL).merged(get_model_routing().for_stage(stage))
+        router = get_llm_router(LLM_BASE_URL, config.model)
+        with timed("llm_call", llm_stage=stage or "unknown", model=config.model):
+            result = router.complete(
+                lambda endpoint, cancel_event: _call_endpoint(endpoint, messages, prompt_name, config, stage,
+                                                              cancel_event, params, until))
         logger.info("Successfully received response from OpenRouter")
         return result
 
+    except DeadlineExceeded:
+        raise
     except openai.APITimeoutError as e:
         logger.error(f"API timeout error: {str(e)}")
+        # timed out because the request ran out of budget, not because the API is slow
+        check_deadline("llm_call")
         return "Error: Request timed out. Please try again."
     except openai.APIConnectionError as e:
         logger.error(f"API connection error: {str(e)}")
@@ -85,62 +175,96 @@ def llm_call(system_prompt, user_prompt):
         logger.error(f"OpenRouter API error: {str(e)}")
         return "Error: An error occurred while processing your request. Please try again."
     except Exception as e:
-        logger.error(f"Error calling OpenRouter API: {str(e)}")
+        logger.error(f"Error calling {log_context}: {str(e)}")
         return f"Error: {str(e)}"
 
-def llm_call_with_image(system_prompt, user_prompt_text, user_base_64_imgs):
+def llm_call(system_prompt, user_prompt, prompt_name=None, stage=None):
+    """Make an API call to the LLM service."""
+    return _chat_completion([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ], prompt_name=prompt_name, stage=stage)
+
+def llm_call_with_image(system_prompt, user_prompt_text, user_base_64_imgs, prompt_name=None, stage=None, params=None, until=None):
     """Make an API call to the LLM service with image content."""
-    try:
-        logger.info("Calling OpenRouter API with images...")
-        
-        api_key = get_api_key()
-
-        # Prepare the messages with images
-        user_prompt_content = [{"type": "text", "text": user_prompt_text}]
-        for img in user_base_64_imgs:
-            img_content = {
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/{img['extension']};base64,{img['content']}"
-                }
+    # Prepare the messages with images
+    user_prompt_content = [{"type": "text", "text": user_prompt_text}]
+    for img in user_base_64_imgs:
+        img_content = {
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/{img['extension']};base64,{img['content']}"
             }
-            user_prompt_content.append(img_content)
-            
-        client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-            timeout=60
-        )
-                    
-        completion = client.chat.completions.create(
-            model="deepseek/deepseek-r1-zero:free",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt_content}
-            ],
-        )
-        
-        result = completion.choices[0].message.content
-        logger.info("Successfully received response from OpenRouter")
+        }
+        user_prompt_content.append(img_content)
+
+    return _chat_completion([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt_content}
+    ], log_context="OpenRouter API with images", prompt_name=prompt_name, stage=stage, params=params, until=until)
+
+class LLMChat:
+    """Multi-turn conversation with the LLM whose prompt is kept under a token ceiling."""
+
+    def __init__(self, system_prompt, keep_recent_turns=KEEP_RECENT_TURNS, max_prompt_tokens=MAX_PROMPT_TOKENS, prompt_name=None, stage=None):
+        self.history = ChatHistory(system_prompt, keep_recent_turns, max_prompt_tokens)
+        self.prompt_name = prompt_name
+        self.stage = stage
+
+    @property
+    def prompt_sizes(self):
+        """Estimated prompt tokens sent at each step."""
+        return self.history.prompt_sizes
+
+    def llm_call(self, user_prompt, summary=None):
+        """
+        Send the next user message and return the reply.
+
+        Args:
+            user_prompt (str): The message sent verbatim while it is recent.
+            summary (str): Compact replacement used once the message ages out.
+        """
+        self.history.add_user(user_prompt, summary)
+        result = _chat_completion(self.history.build_messages(), prompt_name=self.prompt_name, stage=self.stage)
+        self.history.add_assistant(result)
         return result
-        
-    except openai.APITimeoutError as e:
-        logger.error(f"API timeout error: {str(e)}")
-        return "Error: Request timed out. Please try again."
-    except openai.APIConnectionError as e:
-        logger.error(f"API connection error: {str(e)}")
-        return "Error: Failed to connect to the API. Please check your internet connection."
-    except openai.APIError as e:
-        logger.error(f"OpenRouter API error: {str(e)}")
-        return "Error: An error occurred while processing your request. Please try again."
-    except Exception as e:
-        logger.error(f"Error calling OpenRouter API with images: {str(e)}")
-        return f"Error: {str(e)}"
+
+    def set_last_reply_summary(self, summary):
+        """Compact replacement for the last reply once it ages out of the recent turns."""
+        self.history.turns[-1]["summary"] = summary
+
+@timed("zip_download")
+def download_and_extract_zip(code_link, output_folder=None):
+    """
+    Download a submission zip and extract it.
+
+    Args:
+        code_link (str): URL of the zip, or a local path to one.
+        output_folder (str): Where to extract it; a new temporary folder by default.
+
+    Returns:
+        str: The folder the zip was extracted to.
+    """
+    output_folder = output_folder or tempfile.mkdtemp(prefix="submission-")
+    try:
+        if os.path.isfile(code_link):
+            with open(code_link, "rb") as f:
+                content = f.read()
+        else:
+            response = requests.get(code_link, timeout=budget("zip_download", 60))
+            response.raise_for_status()
+            content = response.content
+        with ZipFile(BytesIO(content)) as zip_ref:
+            zip_ref.extractall(output_folder)
+        return output_folder
+    except (requests.exceptions.RequestException, BadZipFile) as e:
+        logger.error(f"Failed to download and extract {code_link}: {str(e)}")
+        raise
 
 def download_image(url):
     """Download an image from a URL and save it temporarily."""
     try:
-        response = requests.get(url, timeout=10)
+        response = requests.get(url, timeout=budget("image_download", 10))
         response.raise_for_status()
         
         with tempfile.NamedTemporaryFile(delete=False, suffix=Path(url).suffix) as temp_file:
@@ -175,10 +299,23 @@ def encode_image_to_base64(image_path):
         logger.error(f"Error encoding image {image_path}: {str(e)}")
         raise
 
-def extract_file_contents_with_tree(folder_path, full_desc=False):
-    """Extract contents of files in a directory tree."""
+def extract_file_contents_with_tree(folder_path, full_desc=False, question_id=None):
+    """
+    Extract contents of files in a directory tree. With the question's starter
+    snapshot, files the student did not touch are listed by name only and
+    changed ones may be sent as a diff against the starter.
+    """
+    with timed("repo_state", full_desc=full_desc) as span:
+        starter = get_starter_snapshot(question_id) if full_desc else None
+        repo_state = _extract_file_contents_with_tree(folder_path, full_desc, starter)
+        span["chars"] = len(repo_state)
+        span["starter_snapshot"] = starter is not None
+        return repo_state
+
+def _extract_file_contents_with_tree(folder_path, full_desc=False, starter=None):
     try:
         result = []
+        unchanged = []
         tree = []
         allowed_extensions = ('.json', '.js', '.ts', '.html', '.css')
 
@@ -204,7 +341,13 @@ def extract_file_contents_with_tree(folder_path, full_desc=False):
                     try:
                         with open(file_path, 'r', encoding='utf-8') as f:
                             content = f.read()
-                        result.append(f"\n{relative_path}:\n{content}\n")
+                        kind, text = starter.describe(relative_path, content) if starter else ("full", content)
+                        if kind == "unchanged":
+                            unchanged.append(relative_path)
+                        elif kind == "diff":
+                            result.append(f"\n{relative_path} (diff against the starter code):\n{text}\n")
+                        else:
+                            result.append(f"\n{relative_path}:\n{text}\n")
                     except Exception as e:
                         logger.error(f"Error reading file {relative_path}: {str(e)}")
                         result.append(f"\nError reading file {relative_path}: {str(e)}\n")
@@ -214,6 +357,8 @@ def extract_file_contents_with_tree(folder_path, full_desc=False):
 
         final_output = f"Directory Tree: \n{tree_str}"
         if full_desc:
+            if unchanged:
+                final_output += "\n\nUnchanged starter files: \n" + "\n".join(sorted(unchanged))
             final_output += f"\n\nFile contents: \n{content_str}"
         
         return final_output
@@ -233,49 +378,19 @@ def get_question_details_from_zip(zip_filename):
         dict: A dictionary containing 'question_command_id', 'question_content', and 'question_test_cases'.
               Returns None if no matching record is found.
     """
-    csv_file_path = 'commands.csv' 
-    
     try:
-        # Read CSV with explicit encoding and handling for special characters
-        df = pd.read_csv(csv_file_path, encoding='utf-8', on_bad_lines='skip')
-        
-        # Clean the data
-        df['question_command_id'] = df['question_command_id'].str.strip()
-        
-        # Print debug information
-        print("CSV File Info:")
-        print(f"Total rows: {len(df)}")
-        print(f"Columns: {df.columns.tolist()}")
-        print(f"First few question IDs: {df['question_command_id'].head().tolist()}")
-        print(f"Looking for ID: {zip_filename}")
-        
-        # Update required_columns to map to existing columns
-        required_columns = ['question_command_id', 'question_content', 'question_test_cases']
-        for column in required_columns:
-            if column not in df.columns:
-                print(f"Error: Column '{column}' not found in the CSV. Available columns: {df.columns.tolist()}")
-                return None
-        
-        # Assuming zip_filename corresponds to 'question_command_id'
-        result = df[df['question_command_id'].str.contains(zip_filename, na=False, case=False)]
-        
-        if result.empty:
+        question = get_catalog().find(zip_filename)
+        if question is None:
             print(f"Error: Question ID '{zip_filename}' not found in the CSV.")
-            print("Available IDs:")
-            for id in df['question_command_id'].unique():
-                print(f"- {id}")
             return None
-        
-        # Assuming 'question_command_id' is unique, take the first matching row
-        row = result.iloc[0]
         return {
-            'question_command_id': str(row['question_command_id']).strip(),
-            'question_content': str(row['question_content']),
-            'question_test_cases': str(row['question_test_cases'])
+            'question_command_id': question.question_command_id,
+            'question_content': question.question_content,
+            'question_test_cases': question.question_test_cases
         }
     
     except FileNotFoundError:
-        print(f"Error: CSV file '{csv_file_path}' not found in current directory: {os.getcwd()}")
+        print(f"Error: CSV file '{get_catalog().path}' not found in current directory: {os.getcwd()}")
         return None
     except pd.errors.EmptyDataError:
         print("Error: The CSV file is empty")
@@ -312,7 +427,7 @@ def copy_folder_to_docker(container_id, zip_path, output_folder):
 
     # Extract zip to workspace
     try:
-        with ZipFile(zip_path, 'r') as zip_ref:
+        with timed("zip_extract"), ZipFile(zip_path, 'r') as zip_ref:
             zip_ref.extractall(workspace_dir)
         print(f"Extracted '{zip_path}' to '{workspace_dir}'.")
     except BadZipFile:
@@ -323,14 +438,15 @@ def copy_folder_to_docker(container_id, zip_path, output_folder):
         return
 
 
-    # Create output directory inside Docker container
-    create_output_cmd = f"docker exec {container_id} mkdir -p {output_folder}"
-    subprocess.run(create_output_cmd, shell=True, check=True)
+    with timed("docker_copy"):
+        # Create output directory inside Docker container
+        create_output_cmd = f"docker exec {container_id} mkdir -p {output_folder}"
+        run_command(create_output_cmd, "docker_copy", check=True)
 
 
-    # Copy contents to Docker container
-    copy_cmd = f"docker cp {workspace_dir}/. {container_id}:{output_folder}"
-    subprocess.run(copy_cmd, shell=True, check=True)
+        # Copy contents to Docker container
+        copy_cmd = f"docker cp {workspace_dir}/. {container_id}:{output_folder}"
+        run_command(copy_cmd, "docker_copy", check=True)
 
 
     print(f"Contents of '{workspace_dir}' have been copied to '{output_folder}' in container '{container_id}'.")
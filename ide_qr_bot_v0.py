@@ -1,17 +1,22 @@
 # ide_qr_bot_v0.py
 
+import logging
 from router import QueryRouter
+from metrics import timed
+from constants import is_container_bound
+from deadline import DeadlineExceeded
+import model_routing
+from prompt_registry import get_prompt_registry
+from catalog import get_catalog
+from test_case_index import TestCaseIndex
+from section_index import get_section_index
+from failure_signatures import get_failure_signatures
+from submission_index import get_submission_index, minhash, read_zip_sources
 from helpers import llm_call, extract_file_contents_with_tree, copy_folder_to_docker, check_and_delete_folder
-from prompts import (
-    conceptual_doubt_prompt,
-    get_implementation_guidance_prompt,
-    get_test_cases_qr_v0_prompt,
-    get_specific_errors_qr_v0_prompt,
-    get_publishing_related_query_system_prompt,
-    get_ide_related_queries_system_prompt
-)
 # Removed Agent import if not used
 
+logger = logging.getLogger(__name__)
+
 class QRBot:
     def __init__(self, user_query, question_id, zip_path="", question_content="", question_test_cases=""): 
         self.user_query = user_query
@@ -24,38 +29,141 @@ class QRBot:
         self.zip_path = zip_path
         self.container_id = "09769941a48c"  # **Update or manage dynamically as needed**
         # Removed folder_location as it's no longer needed
+        # Set by lookup(): the tests the user named (None until it ran) and the submission's MinHash
+        self.failing_tests = None
+        self.submission_signature = None
 
+    @timed("bot_response")
     def get_bot_response(self):
-        self.query_category = self.query_router.classify_query().strip()
-        if self.query_category == "other":
+        if self.classify() == "other":
             return "<mentor_required>"
+        cached = self.lookup()
+        if cached is not None:
+            return cached
+        return self.respond()
+
+    def classify(self):
+        """First half of get_bot_response, split out so the scheduler can pick a lane in between."""
+        try:
+            self.query_category = self.query_router.classify_query().strip()
+        except DeadlineExceeded:
+            # out of time before we even know what was asked, hand over to a mentor
+            self.query_category = "other"
         print(f"Query Category: {self.query_category}")
-        check_and_delete_folder("./workspace")
-        self._generate_bot_response_based_on_category()
+        return self.query_category
+
+    def lookup(self):
+        """
+        An answer that needs neither the container nor the LLM: a pre-generated explanation
+        for the failing-test combination, or the answer to a near-identical earlier submission.
+        Run after classify() and before the docker lane, so hits skip the lane and its setup.
+        Returns None on a miss.
+        """
+        if not self._is_test_case_query() or not self.zip_path:
+            return None
+        self.failing_tests = self._test_case_index().mentioned_in(
+            f"{self.user_query} {self.query_router.updated_query_context}")
+
+        # A common failing-test combination with a pre-generated explanation
+        failure_signatures = get_failure_signatures()
+        explanation = failure_signatures.lookup(self.question_id, [t.id for t in self.failing_tests]) \
+            if failure_signatures else None
+        if explanation is not None:
+            return explanation
+
+        # A near-identical submission with the same failing tests was answered before; without named
+        # tests the answer depends on the question asked, so it is neither reused nor indexed
+        self.submission_signature = self._submission_signature() if self.failing_tests else None
+        return self._find_similar_submission(self.submission_signature, self.failing_tests)
+
+    def respond(self):
+        if is_container_bound(self.query_category):
+            # ./workspace is shared, only the docker lane may touch it
+            check_and_delete_folder("./workspace")
+        try:
+            self._generate_bot_response_based_on_category()
+        except DeadlineExceeded:
+            self.bot_response = "<mentor_required>"
         print(f"Bot Response: {self.bot_response}")
         return self.bot_response
     
+    def _is_test_case_query(self):
+        return "Test case failures" in self.query_category or \
+               "Unexpected output" in self.query_category or \
+               "Mistakes Explanation" in self.query_category
+
+    def _test_case_index(self):
+        question = get_catalog().get(self.question_id)
+        if question is not None and len(question.test_cases):
+            return question.test_cases
+        return TestCaseIndex.build(self.question_test_cases)
+
+    def _submission_signature(self):
+        if get_submission_index() is None:
+            return None
+        try:
+            return minhash(read_zip_sources(self.zip_path))
+        except Exception as e:
+            logger.warning(f"Could not sign submission {self.zip_path}: {str(e)}")
+            return None
+
+    def _find_similar_submission(self, signature, failing):
+        if signature is None:
+            return None
+        match = get_submission_index().find(self.question_id, signature, self.query_category,
+                                            [t.id for t in failing])
+        if match is None:
+            return None
+        response, score = match
+        logger.info(f"Reusing the answer of a submission {score:.2f} similar to this one")
+        return response
+
+    def _remember_submission(self, signature, failing):
+        # placeholders and error strings are not answers worth reusing
+        if signature is None or self.bot_response.startswith(("<", "Error")):
+            return
+        try:
+            get_submission_index().add(self.question_id, signature, self.query_category,
+                                       [t.id for t in failing], self.bot_response)
+        except Exception as e:
+            logger.warning(f"Could not index submission: {str(e)}")
+
     def _generate_bot_response_based_on_category(self):
-        if "Test case failures" in self.query_category or \
-           "Unexpected output" in self.query_category or \
-           "Mistakes Explanation" in self.query_category:
+        if self._is_test_case_query():
             
             if not self.zip_path:
                 self.bot_response = "<please_attach_code_response>"
                 return
-            
+
+            if self.failing_tests is None:
+                # respond() called without lookup() first
+                cached = self.lookup()
+                if cached is not None:
+                    self.bot_response = cached
+                    return
+            test_cases = self._test_case_index()
+            failing = self.failing_tests
+            signature = self.submission_signature
+
             # Extract and prepare Docker environment
             copy_folder_to_docker(self.container_id, self.zip_path, self.question_id)
-            self.repo_state = extract_file_contents_with_tree("./workspace", full_desc=True)
+            self.repo_state = extract_file_contents_with_tree("./workspace", full_desc=True,
+                                                              question_id=self.question_id)
             
-            # Prepare issue context
-            test_cases = self.question_test_cases
+            # The question's test cases come from the cached per-question prefix; the request adds the
+            # tests the user is asking about with their source, then the repo state and the query
+            prefix = get_prompt_registry().question_prefix(
+                "get_test_cases_qr_v0_prompt", self.question_id,
+                self.question_content, self.question_test_cases)
+            failing_block = f"Failing Test Cases: {test_cases.render(failing)}, " if failing else ""
             self.issue_context = (
-                f"User Query: {self.query_router.updated_query_context}, "
+                f"{failing_block}"
                 f"Repo State: {self.repo_state}, "
-                f"Test Cases: {test_cases}"
+                f"User Query: {self.query_router.updated_query_context}"
             )
-            self.bot_response = llm_call(get_test_cases_qr_v0_prompt(), self.issue_context)
+            self.bot_response = llm_call(prefix.text, self.issue_context, prompt_name=prefix.name,
+                                         stage=model_routing.TEST_CASES)
+            self._remember_submission(signature, failing)
 
         elif "Fix specific errors" in self.query_category:
             if not self.zip_path:
@@ -65,19 +173,24 @@ class QRBot:
             copy_folder_to_docker(self.container_id, self.zip_path, self.question_id)
             self.repo_state = extract_file_contents_with_tree("./workspace")
             self.issue_context = f"Repo State: {self.repo_state}, Issue: {self.query_router.updated_query_context}"
-            self.bot_response = llm_call(get_specific_errors_qr_v0_prompt(), self.issue_context)
+            self.bot_response = llm_call(get_prompt_registry().get("get_specific_errors_qr_v0_prompt").text,
+                                         self.issue_context,
+                                         stage=model_routing.SPECIFIC_ERRORS)
 
         elif "Code publishing issue" in self.query_category:
-            self.bot_response = llm_call(get_publishing_related_query_system_prompt(),
-                                         f"User Query: {self.query_router.updated_query_context}")
+            self.bot_response = llm_call(get_prompt_registry().get("get_publishing_related_query_system_prompt").text,
+                                         f"User Query: {self.query_router.updated_query_context}",
+                                         stage=model_routing.PUBLISHING)
 
         elif "IDE issue" in self.query_category:
-            self.bot_response = llm_call(get_ide_related_queries_system_prompt(),
-                                         f"User Query: {self.query_router.updated_query_context}")
+            self.bot_response = llm_call(get_prompt_registry().get("get_ide_related_queries_system_prompt").text,
+                                         f"User Query: {self.query_router.updated_query_context}",
+                                         stage=model_routing.IDE)
 
         elif "Conceptual doubts" in self.query_category:
-            self.bot_response = llm_call(conceptual_doubt_prompt(),
-                                         f"User Query: {self.query_router.updated_query_context}")
+            self.bot_response = llm_call(get_prompt_registry().get("conceptual_doubt_prompt").text,
+                                         f"User Query: {self.query_router.updated_query_context}",
+                                         stage=model_routing.CONCEPTUAL)
 
         elif "Problem solving approach" in self.query_category:
             self.bot_response = "<fixed_question_specific_problem_solving_approach>"
@@ -85,14 +198,28 @@ class QRBot:
         elif "Implementation guidance" in self.query_category:
             if self.zip_path:
                 copy_folder_to_docker(self.container_id, self.zip_path, self.question_id)
-                self.repo_state = extract_file_contents_with_tree("./workspace", full_desc=True)
-                question_context = self.question_content
-                self.issue_context = (
-                    f"Repo State: {self.repo_state}, "
-                    f"Question Context: {question_context}, "
-                    f"User Query: {self.query_router.updated_query_context}"
-                )
-                self.bot_response = llm_call(get_implementation_guidance_prompt(), self.issue_context)
+                self.repo_state = extract_file_contents_with_tree("./workspace", full_desc=True,
+                                                                  question_id=self.question_id)
+                sections = get_section_index().relevant_context(self.question_id,
+                                                                self.query_router.updated_query_context)
+                if sections is None:
+                    # no section stands out: the whole question context, from the cached per-question prefix
+                    prefix = get_prompt_registry().question_prefix(
+                        "get_implementation_guidance_prompt", self.question_id,
+                        self.question_content, self.question_test_cases)
+                    self.issue_context = (
+                        f"Repo State: {self.repo_state}, "
+                        f"User Query: {self.query_router.updated_query_context}"
+                    )
+                else:
+                    prefix = get_prompt_registry().get("get_implementation_guidance_prompt")
+                    self.issue_context = (
+                        f"Repo State: {self.repo_state}, "
+                        f"Question Context: {sections}, "
+                        f"User Query: {self.query_router.updated_query_context}"
+                    )
+                self.bot_response = llm_call(prefix.text, self.issue_context, prompt_name=prefix.name,
+                                             stage=model_routing.IMPLEMENTATION_GUIDANCE)
             else:
                 self.bot_response = "<please_share_current_code>"
         else:
@@ -1,19 +1,39 @@
 from router import QueryRouter
-from helpers import llm_call, download_and_extract_zip,extract_file_contents_with_tree,copy_folder_to_docker,get_question_details
+from helpers import llm_call, download_and_extract_zip,extract_file_contents_with_tree
+from copy_folder_to_docker import copy_folder_to_docker,get_question_details
 from run_test_cases import run_test_case_script
-from prompts import conceptual_doubt_prompt,get_edit_loacalization_task_prompt,get_publishing_related_query_system_prompt,get_ide_related_queries_system_prompt
+from prompts import conceptual_doubt_prompt,get_edit_loacalization_task_prompt,get_publishing_related_query_system_prompt,get_ide_related_queries_system_prompt,get_fixer_prompt
 from agent import Agent
+from overlay_fs import OverlayFS
+from metrics import timed
+from container_pool import get_container_pool
+from deadline import budget
+import model_routing
+from catalog import get_catalog
+from concurrent.futures import ThreadPoolExecutor, as_completed
+# a distinct class from the builtin TimeoutError before Python 3.11
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+import contextvars
+import os
+import threading
+
+# Number of fixer candidates generated and verified in parallel; 1 keeps the single-fix path
+FIX_CANDIDATES = int(os.getenv("FIX_CANDIDATES", "1"))
+# Container the single-fix path copies the submission into and runs the tests in
+FIX_CONTAINER_ID = "5baf109adc77"
 
 
 class QRBot:
-    def __init__(self,user_query,question_id,code_link = ""): 
+    def __init__(self,user_query,question_id,code_link = "",num_candidates=FIX_CANDIDATES): 
         self.user_query = user_query
         self.question_id = question_id
         self.query_category = "other"
         self.repo_state = ""
         self.query_router = QueryRouter(query=self.user_query)
         self.code_link = code_link
+        self.num_candidates = num_candidates
  
+    @timed("bot_response")
     def get_bot_response(self):
         self.query_category = self.query_router.classify_query().strip()
         if self.query_category == "other":
@@ -23,6 +43,12 @@ class QRBot:
         print(bot_response)
         return bot_response
     
+    def _failing_tests(self, test_case_results):
+        """The failing tests with their source when the catalog indexes them, else the raw results."""
+        question = get_catalog().get(self.question_id)
+        failing = question.test_cases.failing(test_case_results) if question is not None else []
+        return question.test_cases.render(failing) if failing else test_case_results
+
     def _generate_bot_response_based_on_category(self):
         
         if self.query_category == "Test Case Failures" or "Unexpected Output":
@@ -30,22 +56,28 @@ class QRBot:
                 return "<please_attach_code_response>"
             output_folder = download_and_extract_zip(self.code_link)
             self.repo_state = extract_file_contents_with_tree(output_folder)
-            copy_folder_to_docker("5baf109adc77",output_folder,get_question_details(self.question_id,"question_folder_location"))
-            test_case_results = run_test_case_script(self.question_id)
+            # Agents read and edit this in-memory snapshot; the disk is touched once before re-running tests
+            self.repo_fs = OverlayFS.from_directory(output_folder)
+            copy_folder_to_docker(FIX_CONTAINER_ID,output_folder,get_question_details(self.question_id,"question_folder_location"))
+            test_case_results = run_test_case_script(FIX_CONTAINER_ID, self.question_id)
             if len(test_case_results['failed'])==0:
                 return "<already_correct_code>" 
             print(test_case_results)
-            self.issue_context = f"Repo State: {self.repo_state}, Test Case Results: {test_case_results}"
+            self.issue_context = f"Repo State: {self.repo_state}, Test Case Results: {self._failing_tests(test_case_results)}"
 
             # generate location of edits based on repo state , issue context and pool of actions and scratchpad based on thoughts sumnmary (refer paper once to see how it would look like)
-            self.edit_agent = Agent(task_desc=get_edit_loacalization_task_prompt(),issue=self.query_router.updated_query_context,repo_state=self.repo_state,max_steps=10)
+            self.edit_agent = Agent(task_desc=get_edit_loacalization_task_prompt(),issue=self.query_router.updated_query_context,repo_state=self.repo_state,max_steps=10,fs=self.repo_fs,stage=model_routing.EDIT_LOCALIZATION_AGENT)
             self.final_edit_thought, self.edit_agent_response = self.edit_agent.execute()
 
-            self.fixer_agent = Agent(task_desc=get_fixer_prompt(f"Developers thought : {self.final_edit_thought},Developers suggestion to which file to edit : {self.edit_agent_response}"),issue=self.query_router.updated_query_context,repo_state=self.repo_state,max_steps=10)
+            if self.num_candidates > 1:
+                return self._best_of_n_fix(output_folder)
+
+            self.fixer_fs = self.repo_fs.copy()
+            self.fixer_agent = Agent(task_desc=get_fixer_prompt(f"Developers thought : {self.final_edit_thought},Developers suggestion to which file to edit : {self.edit_agent_response}"),issue=self.query_router.updated_query_context,repo_state=self.repo_state,max_steps=10,fs=self.fixer_fs,stage=model_routing.FIXER_AGENT)
             self.fixer_agent_response =  self.fixer_agent.execute()
 
-            copy_folder_to_docker("5baf109adc77",output_folder,get_question_details(self.question_id,"question_folder_location"))
-            new_test_case_results = run_test_case_script(self.question_id)
+            self.fixer_fs.flush_to_container(FIX_CONTAINER_ID,get_question_details(self.question_id,"question_folder_location"))
+            new_test_case_results = run_test_case_script(FIX_CONTAINER_ID, self.question_id)
 
             if len(new_test_case_results['failed'])==0 or len(new_test_case_results['failed']) - len(new_test_case_results['failed']) >=3 :
                 return self.fixer_agent_response
@@ -56,30 +88,79 @@ class QRBot:
             output_folder = download_and_extract_zip(self.code_link)
             self.repo_state = extract_file_contents_with_tree(output_folder)
             self.issue_context = f"Repo State: {self.repo_state}, Issue: {self.query_router.updated_query_context}"
+            self.repo_fs = OverlayFS.from_directory(output_folder)
 
-            self.edit_agent = Agent(task_desc=get_edit_loacalization_task_prompt(),issue=self.query_router.updated_query_context,repo_state=self.repo_state,max_steps=10)
+            self.edit_agent = Agent(task_desc=get_edit_loacalization_task_prompt(),issue=self.query_router.updated_query_context,repo_state=self.repo_state,max_steps=10,fs=self.repo_fs,stage=model_routing.EDIT_LOCALIZATION_AGENT)
             self.final_edit_thought, self.edit_agent_response = self.edit_agent.execute()
 
-            self.fixer_agent = Agent(task_desc=get_fixer_prompt(f"Developers thought : {self.final_edit_thought},Developers suggestion to which file to edit : {self.edit_agent_response}"),issue=self.query_router.updated_query_context,repo_state=self.repo_state,max_steps=10)
+            self.fixer_fs = self.repo_fs.copy()
+            self.fixer_agent = Agent(task_desc=get_fixer_prompt(f"Developers thought : {self.final_edit_thought},Developers suggestion to which file to edit : {self.edit_agent_response}"),issue=self.query_router.updated_query_context,repo_state=self.repo_state,max_steps=10,fs=self.fixer_fs,stage=model_routing.FIXER_AGENT)
             self.fixer_agent_response =  self.fixer_agent.execute()
 
             return self.fixer_agent_response
 
 
         elif self.query_category == "Code Publishing issue":
-            result = llm_call(get_publishing_related_query_system_prompt(),f"User Query: {self.query_router.updated_query_context}")
+            result = llm_call(get_publishing_related_query_system_prompt(),f"User Query: {self.query_router.updated_query_context}",stage=model_routing.PUBLISHING)
             return result
         elif self.query_category == "IDE issue":
-            result = llm_call(get_ide_related_queries_system_prompt(),f"User Query: {self.query_router.updated_query_context}")
+            result = llm_call(get_ide_related_queries_system_prompt(),f"User Query: {self.query_router.updated_query_context}",stage=model_routing.IDE)
             return result
         elif self.query_category == "Conceptual Doubts": 
-            result = llm_call(conceptual_doubt_prompt(),f"User Query: {self.query_router.updated_query_context}")
+            result = llm_call(conceptual_doubt_prompt(),f"User Query: {self.query_router.updated_query_context}",stage=model_routing.CONCEPTUAL)
             return result
         elif self.query_category == "Problem-Solving Approach": 
             return "<fixed_question_specific_problem_solving_approach>"
         else:
             return "<mentor_required>"
 
+    def _best_of_n_fix(self, output_folder):
+        """
+        Generate num_candidates fixes concurrently, each on its own overlay copy, and verify
+        each one in a separately leased container. Returns the first fix whose test run
+        passes and cancels the remaining candidates.
+        """
+        pool = get_container_pool()
+        question_folder = get_question_details(self.question_id, "question_folder_location")
+        cancel_event = threading.Event()
 
+        def run_candidate(index):
+            fixer_fs = self.repo_fs.copy()
+            fixer_agent = Agent(task_desc=get_fixer_prompt(f"Developers thought : {self.final_edit_thought},Developers suggestion to which file to edit : {self.edit_agent_response}"),issue=self.query_router.updated_query_context,repo_state=self.repo_state,max_steps=10,fs=fixer_fs,cancel_event=cancel_event,stage=model_routing.FIXER_AGENT)
+            fixer_response = fixer_agent.execute()
+            if cancel_event.is_set() or not fixer_fs.changed_paths():
+                return None
+            with pool.lease(timeout=budget("container_lease")) as container_id:
+                if cancel_event.is_set():
+                    return None
+                # every leased container gets the untouched submission plus this candidate's diff
+                copy_folder_to_docker(container_id, output_folder, question_folder)
+                fixer_fs.flush_to_container(container_id, question_folder)
+                results = run_test_case_script(container_id, self.question_id)
+            print(f"Candidate {index}: {len(results.get('failed', []))} failing tests")
+            if len(results.get('failed', [])) == 0:
+                return fixer_response, fixer_fs
+            return None
 
-
+        executor = ThreadPoolExecutor(max_workers=self.num_candidates)
+        # run each candidate in a copy of this request's context so its spans land in the same trace
+        futures = [executor.submit(contextvars.copy_context().run, run_candidate, i) for i in range(self.num_candidates)]
+        try:
+            # outstanding candidates are cancelled by the finally block when the budget runs out
+            for future in as_completed(futures, timeout=budget("best_of_n_fix")):
+                try:
+                    winner = future.result()
+                except Exception as e:
+                    print(f"Fix candidate failed: {str(e)}")
+                    continue
+                if winner:
+                    cancel_event.set()
+                    self.fixer_agent_response, self.fixer_fs = winner
+                    return self.fixer_agent_response
+            return "<mentor_required>"
+        except FuturesTimeoutError:
+            print("Fix candidates did not finish within the request deadline")
+            return "<mentor_required>"
+        finally:
+            cancel_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
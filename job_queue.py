@@ -0,0 +1,240 @@
+# job_queue.py
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")
+JOB_STORAGE_DIR = os.getenv("JOB_STORAGE_DIR", "job_uploads")
+# Worker threads per process; 0 disables the job API
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Queued jobs beyond this are rejected instead of letting latency grow without bound
+JOB_MAX_QUEUE_DEPTH = int(os.getenv("JOB_MAX_QUEUE_DEPTH", "50"))
+# A running job whose lease expires (worker crashed or restarted) is picked up again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))
+# A job whose lease expired this many times (it keeps crashing or hanging its worker) is failed, not retried
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs are kept this long for GET /jobs/<id>
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+POLL_INTERVAL = 0.5
+
+
+class QueueFullError(Exception):
+    """Raised when the queue is at JOB_MAX_QUEUE_DEPTH."""
+
+    def __init__(self, depth, retry_after):
+        super().__init__(f"Job queue is full ({depth} queued jobs)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """
+    Persistent job queue for long-running bot requests.
+
+    Jobs and their uploaded zips are stored on local disk (SQLite + a storage
+    folder), so queued work survives restarts. Workers claim jobs atomically
+    through the database, which also makes it safe to run one queue per
+    gunicorn worker process against the same files.
+    """
+
+    def __init__(self, handler, db_path=JOB_DB_PATH, storage_dir=JOB_STORAGE_DIR,
+                 workers=JOB_WORKERS, max_depth=JOB_MAX_QUEUE_DEPTH, lease_seconds=JOB_LEASE_SECONDS,
+                 max_attempts=JOB_MAX_ATTEMPTS):
+        """
+        Args:
+            handler (callable): handler(job) -> (result dict, http status) for a claimed job.
+        """
+        self.handler = handler
+        self.db_path = db_path
+        self.storage_dir = storage_dir
+        self.workers = workers
+        self.max_depth = max_depth
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Condition()
+        self._threads = []
+        os.makedirs(storage_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    zip_path TEXT NOT NULL,
+                    zip_name TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    result TEXT,
+                    http_status INTEGER,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Job queue started with {self.workers} workers, max depth {self.max_depth}")
+
+    # ---------------------- Submission ----------------------
+
+    def depth(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def _retry_after(self, depth):
+        """Rough seconds until a slot frees up, from the recent average job duration."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT AVG(finished_at - started_at) FROM (SELECT finished_at, started_at FROM jobs "
+                "WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT 50)").fetchone()
+        average = row[0] or 30
+        return int(average * max(depth - self.max_depth + 1, 1) / max(self.workers, 1)) + 1
+
+    def submit(self, file_storage, zip_name, query):
+        """
+        Persist the upload and enqueue a job.
+
+        Raises:
+            QueueFullError: If JOB_MAX_QUEUE_DEPTH jobs are already waiting.
+        """
+        depth = self.depth()
+        if depth >= self.max_depth:
+            raise QueueFullError(depth, self._retry_after(depth))
+
+        job_id = uuid.uuid4().hex
+        zip_path = os.path.join(self.storage_dir, f"{job_id}.zip")
+        file_storage.save(zip_path)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, zip_path, zip_name, query, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, zip_path, zip_name, query, time.time()))
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    # ---------------------- Status ----------------------
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = {
+                "id": row["id"],
+                "status": row["status"],
+                "created_at": row["created_at"],
+                "started_at": row["started_at"],
+                "finished_at": row["finished_at"],
+            }
+            if row["status"] == QUEUED:
+                job["position"] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?",
+                    (QUEUED, row["created_at"])).fetchone()[0]
+        if row["result"]:
+            job["result"] = json.loads(row["result"])
+            job["http_status"] = row["http_status"]
+        return job
+
+    def wait(self, job_id, timeout):
+        """Long-poll until the job finishes or timeout seconds pass."""
+        deadline = time.time() + timeout
+        job = self.get(job_id)
+        while job and job["status"] in (QUEUED, RUNNING) and time.time() < deadline:
+            time.sleep(min(POLL_INTERVAL, max(deadline - time.time(), 0)))
+            job = self.get(job_id)
+        return job
+
+    # ---------------------- Workers ----------------------
+
+    def _claim_next(self):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                exhausted = conn.execute(
+                    "SELECT id, zip_path FROM jobs WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (RUNNING, now, self.max_attempts)).fetchall()
+                for job in exhausted:
+                    logger.error(f"Job {job['id']} failed: lease expired on all {self.max_attempts} attempts")
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, result = ?, http_status = ?, finished_at = ?, lease_until = NULL "
+                        "WHERE id = ?",
+                        (FAILED, json.dumps({"error": f"Job did not finish in {self.max_attempts} attempts"}),
+                         500, now, job["id"]))
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1", (QUEUED, RUNNING, now)).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, started_at = ?, lease_until = ?, attempts = attempts + 1 "
+                        "WHERE id = ?", (RUNNING, now, now + self.lease_seconds, row["id"]))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        for job in exhausted:
+            self._remove_upload(job["zip_path"])
+        return dict(row) if row is not None else None
+
+    def _finish(self, job, status, result, http_status):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, http_status = ?, finished_at = ?, lease_until = NULL WHERE id = ?",
+                (status, json.dumps(result), http_status, time.time(), job["id"]))
+        self._remove_upload(job["zip_path"])
+
+    def _remove_upload(self, zip_path):
+        try:
+            os.remove(zip_path)
+        except OSError:
+            pass
+
+    def _purge_expired(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                         (time.time() - JOB_RETENTION_SECONDS,))
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim_next()
+            except Exception as e:
+                logger.error(f"Failed to claim job: {str(e)}")
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=POLL_INTERVAL * 4)
+                continue
+
+            logger.info(f"Running job {job['id']} (attempt {job['attempts'] + 1})")
+            try:
+                result, http_status = self.handler(job)
+                status = DONE if http_status < 400 else FAILED
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {str(e)}")
+                result, http_status, status = {"error": str(e)}, 500, FAILED
+            self._finish(job, status, result, http_status)
+            self._purge_expired()
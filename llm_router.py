@@ -0,0 +1,243 @@
+# llm_router.py
+
+import collections
+import concurrent.futures
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+
+from metrics import count, register_gauge, percentile
+from deadline import budget
+
+logger = logging.getLogger(__name__)
+
+# Secondary endpoint/model that slow calls are hedged to; hedging is off unless one of them is set
+LLM_HEDGE_BASE_URL = os.getenv("LLM_HEDGE_BASE_URL", "")
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", "")
+LLM_HEDGE_API_KEY_ENV = os.getenv("LLM_HEDGE_API_KEY_ENV", "api_key")
+# The hedge fires after this percentile of the primary's recent latencies...
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# ...but never sooner than LLM_HEDGE_MIN_DELAY, and after LLM_HEDGE_DEFAULT_DELAY until enough samples exist
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "20"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# A call counts as failed when it errors or takes longer than LLM_BREAKER_SLOW_SECONDS;
+# the breaker opens when that happens to LLM_BREAKER_FAILURE_RATE of the last LLM_BREAKER_WINDOW calls
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+LLM_BREAKER_SLOW_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_SECONDS", "45"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+LATENCY_SAMPLES = 200
+# Shared by every router: hedged pairs of all stages' models run on one pool
+HEDGE_EXECUTOR_THREADS = 32
+
+
+class RequestCancelled(Exception):
+    """Raised inside the losing call of a hedged pair once the other one answered."""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open when too many recent calls failed or were slow; after the
+    cooldown one trial call is let through (half-open) and decides whether it
+    closes again.
+    """
+
+    def __init__(self, window=LLM_BREAKER_WINDOW, min_calls=LLM_BREAKER_MIN_CALLS,
+                 failure_rate=LLM_BREAKER_FAILURE_RATE, slow_seconds=LLM_BREAKER_SLOW_SECONDS,
+                 cooldown=LLM_BREAKER_COOLDOWN):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self._outcomes = collections.deque(maxlen=window)
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record(self, latency, error):
+        failed = error or latency > self.slow_seconds
+        with self._lock:
+            if self._opened_at is not None:
+                if not self._trial_in_flight:
+                    return
+                self._trial_in_flight = False
+                if failed:
+                    self._opened_at = time.monotonic()
+                else:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls and \
+               sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                self._opened_at = time.monotonic()
+                count("llm_breaker_trips")
+                logger.warning("LLM circuit breaker opened")
+
+    def release_trial(self):
+        """A trial call that was cancelled decided nothing; let the next call be the trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class Endpoint:
+    """One OpenAI-compatible base URL + model, with its latency history and breaker."""
+
+    def __init__(self, name, base_url, model, api_key_env="api_key", breaker=None):
+        self.name = name
+        self.base_url = base_url
+        self.model = model
+        self.api_key_env = api_key_env
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+        gauge_name = f"llm_breaker_open_{name}_{re.sub(r'[^A-Za-z0-9_]', '_', model)}"
+        register_gauge(gauge_name, f"1 while the {name} LLM endpoint's breaker for {model} is open",
+                       lambda: int(self.breaker.is_open))
+
+    def record(self, latency, error):
+        if not error:
+            with self._lock:
+                self._latencies.append(latency)
+        self.breaker.record(latency, error)
+
+    def hedge_delay(self):
+        with self._lock:
+            samples = list(self._latencies)
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY
+        return max(LLM_HEDGE_MIN_DELAY, percentile(samples, LLM_HEDGE_PERCENTILE))
+
+
+class LLMRouter:
+    """
+    Sends a completion to the primary endpoint and, if it has not answered
+    within its usual p95 latency, a duplicate to the secondary. The first
+    successful answer wins and the other call is cancelled.
+    """
+
+    def __init__(self, primary, secondary=None):
+        self.primary = primary
+        self.secondary = secondary
+        self._executor = _get_hedge_executor() if secondary else None
+
+    def _attempt(self, endpoint, call_fn, cancel_event):
+        start = time.perf_counter()
+        try:
+            result = call_fn(endpoint, cancel_event)
+        except RequestCancelled:
+            # the other call answered; this one says nothing about the endpoint's health
+            endpoint.breaker.release_trial()
+            raise
+        except Exception:
+            endpoint.record(time.perf_counter() - start, error=True)
+            raise
+        endpoint.record(time.perf_counter() - start, error=False)
+        return result
+
+    def _submit(self, endpoint, call_fn, cancel_event):
+        # a copy of the caller's context keeps the request deadline and metric labels
+        return self._executor.submit(contextvars.copy_context().run, self._attempt, endpoint, call_fn, cancel_event)
+
+    def complete(self, call_fn):
+        """
+        Args:
+            call_fn (callable): call_fn(endpoint, cancel_event) -> reply text; should
+                raise RequestCancelled soon after cancel_event is set.
+        """
+        if self.secondary is None:
+            return self._attempt(self.primary, call_fn, None)
+
+        first, second = self.primary, self.secondary
+        # with both breakers open the primary is still tried rather than failing outright
+        if not first.breaker.allow() and second.breaker.allow():
+            count("llm_hedge", outcome="primary_open")
+            return self._attempt(second, call_fn, None)
+
+        cancel_events = {first.name: threading.Event()}
+        futures = {self._submit(first, call_fn, cancel_events[first.name]): first}
+        hedged = False
+        try:
+            done, _ = concurrent.futures.wait(futures, timeout=budget("llm_hedge", first.hedge_delay()))
+            primary_failed = bool(done) and next(iter(done)).exception() is not None
+            if (not done or primary_failed) and second.breaker.allow():
+                # slow primary: hedge; failed primary: fall back
+                hedged = True
+                count("llm_hedge", outcome="fallback" if primary_failed else "fired")
+                logger.info(f"{'Falling back' if primary_failed else 'Hedging'} LLM call to {second.name}")
+                cancel_events[second.name] = threading.Event()
+                futures[self._submit(second, call_fn, cancel_events[second.name])] = second
+
+            pending = set(futures)
+            error = None
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=budget("llm_call"), return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        error = error or e
+                        continue
+                    if hedged:
+                        count("llm_hedge", outcome=f"{futures[future].name}_won")
+                    return result
+            raise error
+        finally:
+            for event in cancel_events.values():
+                event.set()
+
+
+_hedge_executor = None
+_routers = {}
+_endpoints = {}
+_routers_lock = threading.Lock()
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    if _hedge_executor is None:
+        _hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=HEDGE_EXECUTOR_THREADS,
+                                                                thread_name_prefix="llm-hedge")
+    return _hedge_executor
+
+
+def _get_endpoint(name, base_url, model, api_key_env="api_key"):
+    # one Endpoint (latencies, breaker, gauge) per base URL and model, whichever routers use it
+    key = (name, base_url, model, api_key_env)
+    if key not in _endpoints:
+        _endpoints[key] = Endpoint(name, base_url, model, api_key_env)
+    return _endpoints[key]
+
+
+def get_llm_router(base_url, model):
+    """The process-wide router for a primary endpoint, with the hedge endpoint from the environment."""
+    with _routers_lock:
+        router = _routers.get((base_url, model))
+        if router is None:
+            secondary = None
+            if LLM_HEDGE_BASE_URL or LLM_HEDGE_MODEL:
+                secondary = _get_endpoint("secondary", LLM_HEDGE_BASE_URL or base_url, LLM_HEDGE_MODEL or model,
+                                          LLM_HEDGE_API_KEY_ENV)
+            router = _routers[(base_url, model)] = LLMRouter(_get_endpoint("primary", base_url, model), secondary)
+        return router
@@ -0,0 +1,188 @@
+# llm_telemetry.py
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+from metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# Number of most recent latency samples kept per (prompt, model) for percentiles
+MAX_SAMPLES = 1000
+
+_prompt_names = {}  # sha256 of prompt text -> prompt name
+_prompt_names_loaded = False
+_prompt_names_lock = threading.Lock()
+
+
+def _hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def register_prompt_names(prompts_by_name):
+    """Register {name: prompt text} so calls using those system prompts are tagged by name."""
+    with _prompt_names_lock:
+        for name, text in prompts_by_name.items():
+            if isinstance(text, str):
+                _prompt_names[_hash_text(text)] = name
+
+
+def _load_prompt_functions():
+    """Tag every argument-less prompt builder in prompts.py by its function name."""
+    global _prompt_names_loaded
+    if _prompt_names_loaded:
+        return
+    _prompt_names_loaded = True
+    try:
+        import prompts
+    except ImportError:
+        return
+    builders = {}
+    for name, fn in inspect.getmembers(prompts, inspect.isfunction):
+        if fn.__module__ == prompts.__name__ and not inspect.signature(fn).parameters:
+            try:
+                builders[name] = fn()
+            except Exception:
+                continue
+    register_prompt_names(builders)
+
+
+def prompt_name_for(system_prompt):
+    """Name of the prompt function or constant that produced system_prompt."""
+    _load_prompt_functions()
+    if not isinstance(system_prompt, str):
+        return "unknown"
+    return _prompt_names.get(_hash_text(system_prompt), "unknown")
+
+
+class LLMCallRecord:
+    """Measurements of a single LLM invocation."""
+
+    def __init__(self, prompt_name, model, messages, stage=None):
+        self.prompt_name = prompt_name or prompt_name_for(messages[0]["content"] if messages else "")
+        self.model = model
+        self.stage = stage or "unknown"
+        self.request_bytes = len(json.dumps(messages).encode("utf-8"))
+        self.image_count = sum(
+            1 for m in messages if isinstance(m["content"], list)
+            for part in m["content"] if isinstance(part, dict) and part.get("type") == "image_url"
+        )
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.cached_tokens = None
+        self.retries = 0
+        self.error = None
+        self.time_to_first_token = None
+        self.latency = None
+        self._start = time.perf_counter()
+
+    def mark_first_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self._start
+
+    def set_usage(self, usage):
+        """Accepts the SDK usage object or the raw usage dict."""
+        if usage is None:
+            return
+        if not isinstance(usage, dict):
+            usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+        self.prompt_tokens = usage.get("prompt_tokens")
+        self.completion_tokens = usage.get("completion_tokens")
+        # prompt tokens the provider served from its prompt cache, when it reports them
+        details = usage.get("prompt_tokens_details") or {}
+        if not isinstance(details, dict):
+            details = details.model_dump() if hasattr(details, "model_dump") else vars(details)
+        self.cached_tokens = details.get("cached_tokens")
+
+    def finish(self):
+        self.latency = time.perf_counter() - self._start
+        record_llm_call(self)
+
+    def to_dict(self):
+        return {
+            "prompt": self.prompt_name,
+            "stage": self.stage,
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "request_bytes": self.request_bytes,
+            "image_count": self.image_count,
+            "time_to_first_token": self.time_to_first_token,
+            "latency": self.latency,
+            "retries": self.retries,
+            "error": self.error,
+        }
+
+
+_lock = threading.Lock()
+_aggregates = {}  # (prompt, stage, model) -> dict
+
+
+def record_llm_call(record):
+    key = (record.prompt_name, record.stage, record.model)
+    with _lock:
+        agg = _aggregates.get(key)
+        if agg is None:
+            agg = _aggregates[key] = {
+                "calls": 0, "errors": 0, "retries": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+                "request_bytes": 0, "image_count": 0,
+                "latencies": [], "ttfts": [],
+            }
+        agg["calls"] += 1
+        agg["errors"] += 1 if record.error else 0
+        agg["retries"] += record.retries
+        agg["prompt_tokens"] += record.prompt_tokens or 0
+        agg["completion_tokens"] += record.completion_tokens or 0
+        agg["cached_tokens"] += record.cached_tokens or 0
+        agg["request_bytes"] += record.request_bytes
+        agg["image_count"] += record.image_count
+        agg["latencies"] = (agg["latencies"] + [record.latency])[-MAX_SAMPLES:]
+        if record.time_to_first_token is not None:
+            agg["ttfts"] = (agg["ttfts"] + [record.time_to_first_token])[-MAX_SAMPLES:]
+    logger.info(f"LLM call {record.to_dict()}")
+
+
+def get_llm_telemetry():
+    """Aggregated telemetry per prompt, pipeline stage and model, sorted by total prompt tokens."""
+    with _lock:
+        items = [(key, dict(agg)) for key, agg in _aggregates.items()]
+    summary = []
+    for (prompt_name, stage, model), agg in items:
+        calls = agg["calls"]
+        summary.append({
+            "prompt": prompt_name,
+            "stage": stage,
+            "model": model,
+            "calls": calls,
+            "errors": agg["errors"],
+            "retries": agg["retries"],
+            "prompt_tokens_total": agg["prompt_tokens"],
+            "completion_tokens_total": agg["completion_tokens"],
+            "cached_tokens_total": agg["cached_tokens"],
+            "cache_hit_ratio": agg["cached_tokens"] / agg["prompt_tokens"] if agg["prompt_tokens"] else None,
+            "avg_prompt_tokens": agg["prompt_tokens"] / calls,
+            "avg_completion_tokens": agg["completion_tokens"] / calls,
+            "avg_request_bytes": agg["request_bytes"] / calls,
+            "images_total": agg["image_count"],
+            "latency_p50": percentile(agg["latencies"], 50),
+            "latency_p95": percentile(agg["latencies"], 95),
+            "ttft_p50": percentile(agg["ttfts"], 50),
+            "ttft_p95": percentile(agg["ttfts"], 95),
+        })
+    summary.sort(key=lambda row: row["prompt_tokens_total"], reverse=True)
+    return summary
+
+
+def dump_llm_telemetry(path=None):
+    """Write the aggregated telemetry as JSON to path (LLM_TELEMETRY_PATH by default)."""
+    path = path or os.getenv("LLM_TELEMETRY_PATH", "llm_telemetry.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(get_llm_telemetry(), f, indent=2)
+    return path
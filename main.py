@@ -1,20 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
 import os
 import glob
 from ide_qr_bot_v0 import QRBot
 from copy_folder_to_docker import prepare_docker_environment
 from helpers import get_question_details_from_zip
+from metrics import render_prometheus, request_scope
+from llm_telemetry import get_llm_telemetry
+from tracing import trace_request
+from deadline import deadline_scope, DeadlineExceeded
+from singleflight import get_singleflight, request_key, hash_file
+from response_store import get_response_store, response_key, is_storable
+from scheduler import get_scheduler, LaneFullError
+from job_queue import JobQueue, QueueFullError, JOB_WORKERS
+from prompt_registry import get_prompt_registry
+from section_index import get_section_index
 import tempfile
 
 app = Flask(__name__)
 
+# Build the system prompts, per-question prefixes and section index before the first request
+get_prompt_registry()
+get_section_index()
+
+# Upper bound for GET /jobs/<id>?wait=, keeps long-polls under proxy idle timeouts
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", "30"))
+
 # Enable CORS for all routes with port 3005
 CORS(app, resources={
     r"/*": {
         "origins": ["http://localhost:3005", "http://127.0.0.1:3005","https://ide-mentor-bot-frontend.onrender.com"],
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Accept"],
+        "allow_headers": ["Content-Type", "Accept", "Idempotency-Key"],
         "expose_headers": ["Content-Type", "Accept"]
     }
 })
@@ -22,20 +39,49 @@ CORS(app, resources={
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Accept')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Accept,Idempotency-Key')
     response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
+    if getattr(g, 'request_id', None):
+        response.headers['X-Request-ID'] = g.request_id
     return response
 
 @app.route('/')
 def health_check():
     return jsonify({"status": "ok", "message": "Server is running"}), 200
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/llm')
+def llm_metrics_endpoint():
+    """Per-prompt LLM token, size and latency telemetry as JSON."""
+    return jsonify(get_llm_telemetry())
+
 @app.route('/process', methods=['POST', 'OPTIONS'])
 def process_zip_and_query():
     if request.method == 'OPTIONS':
         return '', 204
 
+    with request_scope(), deadline_scope(), trace_request('/process', request.headers.get('X-Request-ID')) as trace:
+        g.request_id = trace.request_id
+        result = _process_zip_and_query()
+        trace.set(status=result[1] if isinstance(result, tuple) else 200)
+        return result
+
+def _process_zip_and_query():
     try:
+        # A retry of a request whose response was already stored is answered without the upload
+        idempotency_key = request.headers.get('Idempotency-Key')
+        store = get_response_store()
+        if idempotency_key and store:
+            stored = store.get_by_idempotency_key(idempotency_key)
+            if stored:
+                body, status = stored
+                response = jsonify(body)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response, status
+
         # Get the uploaded zip file and user query
         if 'zip' not in request.files:
             return jsonify({"error": "No zip file provided"}), 400
@@ -56,46 +102,165 @@ def process_zip_and_query():
             
             # Get the filename without extension
             zip_filename = os.path.splitext(zip_file.filename)[0]
-            print(f"Processing zip file with ID: {zip_filename}")
-            
-            # Process the zip file
-            question_details = get_question_details_from_zip(zip_filename)
-            if not question_details:
-                return jsonify({
-                    "error": f"Could not find question details for ID: {zip_filename}. Please ensure the zip filename matches a valid question ID in commands.csv"
-                }), 400
-            
-            question_command_id = question_details['question_command_id']
-            question_content = question_details['question_content']
-            question_test_cases = question_details['question_test_cases']
-            
-            print(f"Found question details for ID {question_command_id}")
-            
-            try:
-                container_id = "dd5790b111f4"  # **Update with your container ID or manage dynamically**
-                
-                # Step 1: Prepare Docker environment
-                prepare_docker_environment(question_command_id, temp_zip_path, container_id)
-                
-                # Step 2: Initialize QRBot and get response
-                qrbot = QRBot(
-                    user_query=user_query,
-                    question_id=question_command_id,
-                    zip_path=temp_zip_path,
-                    question_content=question_content,
-                    question_test_cases=question_test_cases
-                )
-                output = qrbot.get_bot_response()
-                
-                return jsonify({"response": output})
-            except Exception as docker_error:
-                print(f"Docker-related error: {str(docker_error)}")
-                return jsonify({"error": f"Error setting up environment: {str(docker_error)}"}), 500
+            body, status = _coalesced_pipeline(temp_zip_path, zip_filename, user_query, idempotency_key=idempotency_key)
+            return jsonify(body), status
     
     except Exception as e:
         print(f"Error processing request: {str(e)}")  # Add server-side logging
         return jsonify({"error": f"Error processing request: {str(e)}"}), 500
 
+def run_pipeline(zip_path, zip_filename, user_query, reject_when_full=True):
+    """
+    Runs the bot for an uploaded zip, shared by /process and the job workers.
+    Job workers pass reject_when_full=False to wait for a busy lane instead of failing.
+
+    Returns:
+        tuple: (response body dict, HTTP status code)
+    """
+    print(f"Processing zip file with ID: {zip_filename}")
+    
+    # Process the zip file
+    question_details = get_question_details_from_zip(zip_filename)
+    if not question_details:
+        return {
+            "error": f"Could not find question details for ID: {zip_filename}. Please ensure the zip filename matches a valid question ID in commands.csv"
+        }, 400
+    
+    question_command_id = question_details['question_command_id']
+    question_content = question_details['question_content']
+    question_test_cases = question_details['question_test_cases']
+    
+    print(f"Found question details for ID {question_command_id}")
+    
+    try:
+        container_id = "dd5790b111f4"  # **Update with your container ID or manage dynamically**
+        
+        # Step 1: Initialize QRBot
+        qrbot = QRBot(
+            user_query=user_query,
+            question_id=question_command_id,
+            zip_path=zip_path,
+            question_content=question_content,
+            question_test_cases=question_test_cases
+        )
+        
+        # Step 2: Classify, then prepare Docker and answer in the lane the category needs
+        output = get_scheduler().run(
+            qrbot,
+            prepare=lambda: prepare_docker_environment(question_command_id, zip_path, container_id),
+            reject_when_full=reject_when_full
+        )
+        
+        return {"response": output}, 200
+    except LaneFullError as e:
+        return {"error": f"Server busy, please retry: {str(e)}"}, 429
+    except Exception as docker_error:
+        print(f"Docker-related error: {str(docker_error)}")
+        return {"error": f"Error setting up environment: {str(docker_error)}"}, 500
+
+def _coalesced_pipeline(zip_path, zip_filename, user_query, reject_when_full=True, idempotency_key=None):
+    """
+    run_pipeline, answered from the response store when this code and query were
+    answered before, and shared with identical requests already running.
+    """
+    code_hash = hash_file(zip_path)
+    store = get_response_store()
+    # keyed by the resolved question, so differently named zips of one question share answers
+    question_details = get_question_details_from_zip(zip_filename)
+    question_command_id = question_details['question_command_id'] if question_details else zip_filename
+    stored_key = response_key(question_command_id, code_hash, user_query)
+    if store:
+        stored = store.get(stored_key)
+        if stored:
+            if idempotency_key:
+                store.link(idempotency_key, stored_key)
+            return stored
+
+    try:
+        body, status = get_singleflight().do(
+            request_key(code_hash, question_command_id, user_query),
+            lambda: run_pipeline(zip_path, zip_filename, user_query, reject_when_full=reject_when_full),
+            cacheable=lambda result: is_storable(*result)
+        )
+    except DeadlineExceeded:
+        return {"response": "<mentor_required>"}, 200
+
+    if store and is_storable(body, status):
+        store.put(stored_key, question_command_id, body, status, idempotency_key=idempotency_key)
+    return body, status
+
+@app.route('/responses/<idempotency_key>', methods=['GET'])
+def get_stored_response(idempotency_key):
+    """The stored response of a /process request sent with this Idempotency-Key header."""
+    store = get_response_store()
+    stored = store.get_by_idempotency_key(idempotency_key) if store else None
+    if stored is None:
+        return jsonify({"error": f"No stored response for key: {idempotency_key}"}), 404
+    body, status = stored
+    return jsonify(body), status
+
+def _run_job(job):
+    """Job queue handler: runs a persisted upload through the same pipeline as /process."""
+    with request_scope(), deadline_scope(), trace_request('/jobs', job['id']) as trace:
+        body, status = _coalesced_pipeline(job['zip_path'], job['zip_name'], job['query'], reject_when_full=False)
+        trace.set(status=status)
+        return body, status
+
+job_queue = None
+
+def start_job_queue():
+    """
+    Starts this process's job workers. Called by gunicorn.conf.py in each
+    serving worker and by __main__, not on import, so scripts importing the
+    pipeline do not start consuming jobs.db.
+    """
+    global job_queue
+    if job_queue is None and JOB_WORKERS > 0:
+        job_queue = JobQueue(_run_job)
+        job_queue.start()
+    return job_queue
+
+@app.route('/jobs', methods=['POST', 'OPTIONS'])
+def submit_job():
+    """Enqueues a zip + query and returns a job ID to poll instead of holding the connection open."""
+    if request.method == 'OPTIONS':
+        return '', 204
+    if job_queue is None:
+        return jsonify({"error": "Job queue is not running in this process (JOB_WORKERS=0)"}), 503
+
+    if 'zip' not in request.files:
+        return jsonify({"error": "No zip file provided"}), 400
+    zip_file = request.files['zip']
+    if not zip_file.filename:
+        return jsonify({"error": "No zip file selected"}), 400
+    user_query = request.form.get('query', '')
+    if not user_query:
+        return jsonify({"error": "No query provided"}), 400
+
+    try:
+        job_id = job_queue.submit(zip_file, os.path.splitext(zip_file.filename)[0], user_query)
+    except QueueFullError as e:
+        response = jsonify({"error": str(e), "retry_after": e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status and result; ?wait=N long-polls up to N seconds (capped at JOB_MAX_WAIT_SECONDS)."""
+    if job_queue is None:
+        return jsonify({"error": "Job queue is not running in this process (JOB_WORKERS=0)"}), 503
+    try:
+        wait = min(float(request.args.get('wait', 0)), JOB_MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
+    job = job_queue.wait(job_id, wait) if wait > 0 else job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"No job with ID: {job_id}"}), 404
+    return jsonify(job), 200
+
 if __name__ == "__main__":
+    start_job_queue()
     print("Starting Flask server on port 5000...")
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,153 @@
+# metrics.py
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "qr_bot"
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+UNCLASSIFIED = "unclassified"
+
+_current_category = contextvars.ContextVar("query_category", default=UNCLASSIFIED)
+
+_lock = threading.Lock()
+_histograms = {}  # (stage, category) -> {"buckets": [...], "sum": float, "count": int}
+_counters = {}  # (name, sorted label items) -> int
+_gauges = {}  # name -> (help, fn)
+_span_listeners = []
+
+
+def set_query_category(category):
+    """Label every span that finishes from now on in this request with the category."""
+    _current_category.set(category.strip() if category else UNCLASSIFIED)
+
+
+def get_query_category():
+    return _current_category.get()
+
+
+@contextmanager
+def request_scope():
+    """Reset the per-request labels; worker threads are reused across requests."""
+    token = _current_category.set(UNCLASSIFIED)
+    try:
+        yield
+    finally:
+        _current_category.reset(token)
+
+
+def observe(stage, duration, category=None):
+    """Record one stage duration (seconds) in the latency histogram."""
+    key = (stage, category or get_query_category())
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += duration
+        histogram["count"] += 1
+
+
+def count(name, value=1, **labels):
+    """Increment a counter, e.g. count("stage_errors", stage="classify")."""
+    labels.setdefault("category", get_query_category())
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def register_gauge(name, help_text, fn):
+    """Expose the value returned by fn() as a gauge on /metrics."""
+    _gauges[name] = (help_text, fn)
+
+
+def add_span_listener(fn):
+    """Call fn(span) for every finished span, e.g. to attach it to a request trace."""
+    _span_listeners.append(fn)
+
+
+@contextmanager
+def timed(stage, **attrs):
+    """
+    Time a pipeline stage. Yields a span dict that the caller may annotate
+    (sizes, outcome); the duration is recorded when the block exits.
+    """
+    start = time.perf_counter()
+    span = {"stage": stage, "outcome": "ok", "start": start, **attrs}
+    try:
+        yield span
+    except Exception:
+        span["outcome"] = "error"
+        raise
+    finally:
+        span["duration"] = time.perf_counter() - start
+        span["category"] = get_query_category()
+        observe(stage, span["duration"])
+        count("stage_total", stage=stage, outcome=span["outcome"])
+        for listener in _span_listeners:
+            try:
+                listener(span)
+            except Exception as e:
+                logger.warning(f"Span listener failed: {str(e)}")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values, or None when there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _label_str(labels):
+    escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels]
+    return ",".join(f'{k}="{v}"' for k, v in escaped)
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    name = f"{METRIC_PREFIX}_stage_duration_seconds"
+    lines.append(f"# HELP {name} Duration of pipeline stages.")
+    lines.append(f"# TYPE {name} histogram")
+    with _lock:
+        histograms = {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}
+                      for k, v in _histograms.items()}
+        counters = dict(_counters)
+    for (stage, category), histogram in sorted(histograms.items()):
+        labels = [("stage", stage), ("category", category)]
+        for bound, value in zip(LATENCY_BUCKETS, histogram["buckets"]):
+            lines.append(f'{name}_bucket{{{_label_str(labels + [("le", bound)])}}} {value}')
+        lines.append(f'{name}_bucket{{{_label_str(labels + [("le", "+Inf")])}}} {histogram["count"]}')
+        lines.append(f'{name}_sum{{{_label_str(labels)}}} {histogram["sum"]}')
+        lines.append(f'{name}_count{{{_label_str(labels)}}} {histogram["count"]}')
+
+    for counter_name in sorted({n for n, _ in counters}):
+        full_name = f"{METRIC_PREFIX}_{counter_name}"
+        lines.append(f"# TYPE {full_name} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == counter_name:
+                lines.append(f"{full_name}{{{_label_str(labels)}}} {value}")
+
+    for gauge_name, (help_text, fn) in sorted(_gauges.items()):
+        try:
+            value = fn()
+        except Exception as e:
+            logger.warning(f"Failed to read gauge {gauge_name}: {str(e)}")
+            continue
+        if value is None:
+            continue
+        full_name = f"{METRIC_PREFIX}_{gauge_name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} gauge")
+        lines.append(f"{full_name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,103 @@
+# model_routing.py
+
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# JSON map of pipeline stage -> model and parameters; missing file keeps every stage on the default model
+MODEL_ROUTING_PATH = os.getenv("MODEL_ROUTING_PATH", "model_routing.json")
+
+# Stage names passed to helpers.llm_call / LLMChat
+CLASSIFY_QUERY = "classify_query"
+TEST_CASES = "qr_bot.test_cases"
+SPECIFIC_ERRORS = "qr_bot.specific_errors"
+PUBLISHING = "qr_bot.publishing"
+IDE = "qr_bot.ide"
+CONCEPTUAL = "qr_bot.conceptual"
+IMPLEMENTATION_GUIDANCE = "qr_bot.implementation_guidance"
+AGENT_STEP = "agent_step"
+EDIT_LOCALIZATION_AGENT = "agent_step.edit_localization"
+FIXER_AGENT = "agent_step.fixer"
+FAILURE_SIGNATURES = "offline.failure_signatures"
+
+PARAMETERS = ("model", "max_tokens", "temperature", "timeout")
+
+
+class StageConfig:
+    def __init__(self, model=None, max_tokens=None, temperature=None, timeout=None):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+
+    def merged(self, other):
+        """This config with the parameters other sets taking precedence."""
+        return StageConfig(**{p: getattr(other, p) if getattr(other, p) is not None else getattr(self, p)
+                              for p in PARAMETERS})
+
+    def request_params(self):
+        """Extra keyword arguments for chat.completions.create."""
+        params = {}
+        if self.max_tokens is not None:
+            params["max_tokens"] = self.max_tokens
+        if self.temperature is not None:
+            params["temperature"] = self.temperature
+        return params
+
+    def to_dict(self):
+        return {p: getattr(self, p) for p in PARAMETERS}
+
+
+class ModelRouting:
+    """
+    Resolves a stage name to its StageConfig. "qr_bot.ide" falls back to
+    "qr_bot", then to "default":
+
+        {"default": {"model": "deepseek/deepseek-r1-zero:free", "timeout": 60},
+         "stages": {"classify_query": {"model": "...", "max_tokens": 200, "temperature": 0},
+                    "qr_bot": {"model": "...", "max_tokens": 800}}}
+    """
+
+    def __init__(self, default=None, stages=None):
+        self.default = default or StageConfig()
+        self.stages = stages or {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        unknown = [key for entry in [data.get("default", {})] + list(data.get("stages", {}).values())
+                   for key in entry if key not in PARAMETERS]
+        if unknown:
+            raise ValueError(f"Unknown model routing parameters in {path}: {sorted(set(unknown))}")
+        return cls(StageConfig(**data.get("default", {})),
+                   {stage: StageConfig(**entry) for stage, entry in data.get("stages", {}).items()})
+
+    def for_stage(self, stage):
+        config = self.default
+        if stage:
+            parts = stage.split(".")
+            for i in range(1, len(parts) + 1):
+                entry = self.stages.get(".".join(parts[:i]))
+                if entry is not None:
+                    config = config.merged(entry)
+        return config
+
+
+_routing = None
+_routing_lock = threading.Lock()
+
+
+def get_model_routing():
+    global _routing
+    with _routing_lock:
+        if _routing is None:
+            if os.path.isfile(MODEL_ROUTING_PATH):
+                _routing = ModelRouting.load(MODEL_ROUTING_PATH)
+                logger.info(f"Loaded model routing for {len(_routing.stages)} stages from {MODEL_ROUTING_PATH}")
+            else:
+                _routing = ModelRouting()
+        return _routing
@@ -0,0 +1,145 @@
+# overlay_fs.py
+
+import difflib
+import logging
+import os
+import posixpath
+import tempfile
+from zipfile import ZipFile
+
+logger = logging.getLogger(__name__)
+
+SKIP_DIRS = ('node_modules', '.git')
+
+
+class OverlayFS:
+    """
+    In-memory view of a repo snapshot for the Agent actions.
+
+    Reads are served from the snapshot, edits and adds are kept in a separate
+    overlay so the snapshot itself is never modified. Copies share the snapshot
+    and only duplicate the overlay, so several agents can work on the same repo
+    without cloning directories. Nothing touches the disk until flush().
+    """
+
+    def __init__(self, base=None, roots=("./workspace",)):
+        self._base = base if base is not None else {}
+        self._changes = {}
+        self.roots = [self._clean(r) for r in roots if r]
+
+    @staticmethod
+    def _clean(path):
+        path = path.replace("\\", "/")
+        path = posixpath.normpath(path)
+        return "" if path == "." else path
+
+    def _key(self, path):
+        """Map any path the agent uses (./workspace/src/App.js, src/App.js, ...) to a snapshot key."""
+        path = self._clean(path)
+        for root in self.roots:
+            if path == root:
+                return ""
+            if path.startswith(root + "/"):
+                return path[len(root) + 1:]
+        return path
+
+    @classmethod
+    def from_directory(cls, folder_path, roots=("./workspace",)):
+        """Snapshot all text files under folder_path."""
+        base = {}
+        for root, dirs, files in os.walk(folder_path):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            for file in files:
+                file_path = os.path.join(root, file)
+                relative_path = os.path.relpath(file_path, folder_path).replace(os.sep, "/")
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        base[relative_path] = f.read()
+                except (UnicodeDecodeError, OSError):
+                    continue
+        return cls(base, roots=tuple(roots) + (folder_path,))
+
+    @classmethod
+    def from_zip(cls, zip_path, roots=("./workspace",)):
+        """Snapshot all text files in a submission zip without extracting it."""
+        base = {}
+        with ZipFile(zip_path, 'r') as zip_ref:
+            for name in zip_ref.namelist():
+                if name.endswith('/') or any(part in SKIP_DIRS for part in name.split('/')):
+                    continue
+                try:
+                    base[name] = zip_ref.read(name).decode('utf-8')
+                except UnicodeDecodeError:
+                    continue
+        return cls(base, roots=roots)
+
+    def exists(self, path):
+        key = self._key(path)
+        return key in self._changes or key in self._base
+
+    def read(self, path):
+        key = self._key(path)
+        if key in self._changes:
+            return self._changes[key]
+        if key in self._base:
+            return self._base[key]
+        raise FileNotFoundError(path)
+
+    def write(self, path, content):
+        """Replace the content of an existing file."""
+        if not self.exists(path):
+            raise FileNotFoundError(path)
+        self._changes[self._key(path)] = content
+
+    def add(self, path, content):
+        """Create a new file."""
+        if self.exists(path):
+            raise FileExistsError(path)
+        self._changes[self._key(path)] = content
+
+    def list_files(self):
+        return sorted(set(self._base) | set(self._changes))
+
+    def copy(self):
+        clone = OverlayFS(self._base)
+        clone.roots = list(self.roots)
+        clone._changes = dict(self._changes)
+        return clone
+
+    def changed_paths(self):
+        return sorted(key for key, content in self._changes.items() if self._base.get(key) != content)
+
+    def diff(self):
+        """Unified diff of the overlay against the snapshot."""
+        chunks = []
+        for key in self.changed_paths():
+            old = self._base.get(key)
+            chunks.extend(difflib.unified_diff(
+                [] if old is None else old.splitlines(keepends=True),
+                self._changes[key].splitlines(keepends=True),
+                fromfile="/dev/null" if old is None else f"a/{key}",
+                tofile=f"b/{key}",
+            ))
+        return "".join(chunks)
+
+    def flush(self, target_dir):
+        """Write only the changed files into target_dir. Returns the written paths."""
+        written = []
+        for key in self.changed_paths():
+            file_path = os.path.join(target_dir, *key.split("/"))
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(self._changes[key])
+            written.append(file_path)
+        logger.info(f"Flushed {len(written)} changed files to {target_dir}")
+        return written
+
+    def flush_to_container(self, container_id, output_folder):
+        """Copy only the changed files into the container folder."""
+        from copy_folder_to_docker import copy_folder_to_docker
+
+        if not self.changed_paths():
+            return
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.flush(temp_dir)
+            copy_folder_to_docker(container_id, temp_dir, output_folder)
@@ -0,0 +1,111 @@
+# prompt_registry.py
+
+import hashlib
+import inspect
+import logging
+import threading
+
+import prompts
+from catalog import get_catalog, add_reload_listener
+from llm_telemetry import register_prompt_names
+from question_context import compact_question_content
+
+logger = logging.getLogger(__name__)
+
+# System prompts that get the question's details appended, so the whole prefix is identical
+# across every request for that question and can be served from the provider's prompt cache
+# (the question columns each one uses; the failing tests with their source go in the user prompt)
+QUESTION_PROMPTS = {
+    "get_implementation_guidance_prompt": ("question_content",),
+    "get_test_cases_qr_v0_prompt": ("question_test_cases",),
+}
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PromptEntry:
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self.sha256 = _sha256(text)
+
+
+def build_question_prefix(system_prompt, question_context, question_test_cases):
+    """System prompt followed by the per-question details; nothing request-specific."""
+    sections = [system_prompt.rstrip()]
+    if question_context:
+        sections.append(f"## Question Details\n{question_context}")
+    if question_test_cases:
+        sections.append(f"## Test Cases\n{question_test_cases}")
+    return "\n\n".join(sections) + "\n"
+
+
+class PromptRegistry:
+    """
+    Every argument-less prompt in prompts.py built and hashed once, plus the
+    per-question system prefixes precompiled from the catalog. Rebuilt when
+    the catalog is reloaded.
+    """
+
+    def __init__(self):
+        self._prompts = {}
+        self._prefixes = {}  # (prompt name, question_command_id lower) -> PromptEntry
+        self._lock = threading.Lock()
+        for name, fn in inspect.getmembers(prompts, inspect.isfunction):
+            if fn.__module__ == prompts.__name__ and not inspect.signature(fn).parameters:
+                self._prompts[name] = PromptEntry(name, fn())
+        register_prompt_names({name: entry.text for name, entry in self._prompts.items()})
+        logger.info(f"Built {len(self._prompts)} system prompts")
+
+    def get(self, name):
+        return self._prompts[name]
+
+    def precompile(self, catalog):
+        prefixes = {}
+        # runs inside the catalog's reload, so read its index directly instead of catalog.questions()
+        for question in catalog.by_command_id.values():
+            for name in QUESTION_PROMPTS:
+                prefixes[(name, question.question_command_id.lower())] = self._build_prefix(
+                    name, question.question_context, question.question_test_cases)
+        with self._lock:
+            self._prefixes = prefixes
+        logger.info(f"Precompiled {len(prefixes)} question prompt prefixes")
+
+    def _build_prefix(self, name, question_context, question_test_cases):
+        columns = QUESTION_PROMPTS[name]
+        return PromptEntry(name, build_question_prefix(
+            self._prompts[name].text,
+            question_context if "question_content" in columns else "",
+            question_test_cases if "question_test_cases" in columns else ""))
+
+    def question_prefix(self, name, question_command_id, question_content="", question_test_cases=""):
+        """
+        The precompiled prefix of a catalog question, or one built from the given
+        details for questions the catalog does not know.
+        """
+        with self._lock:
+            entry = self._prefixes.get((name, str(question_command_id).strip().lower()))
+        if entry is None:
+            entry = self._build_prefix(name, compact_question_content(question_content), question_test_cases)
+        return entry
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_prompt_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PromptRegistry()
+            try:
+                catalog = get_catalog()
+                catalog.version
+                _registry.precompile(catalog)
+            except Exception as e:
+                logger.warning(f"Could not precompile question prompts: {str(e)}")
+            add_reload_listener(_registry.precompile)
+        return _registry
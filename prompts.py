@@ -21,6 +21,23 @@ def get_query_classification_prompt():
     }"""
     return prompt
 
+def get_compact_query_classification_prompt():
+    prompt = """Classify a student's query about their React coding assignment. Answer with one line of JSON and nothing else:
+{"c":"<code>","e":"<error message quoted in the query or screenshot, else empty>","s":"<query summary, max 25 words>"}
+
+Codes:
+T = test cases failing
+U = output differs from what is expected
+M = asks what is wrong in their code
+F = a specific error message to fix
+P = publishing or submitting the code (ccbp submit/publish)
+I = IDE, terminal, npm or environment problem
+C = conceptual doubt about a topic
+S = how to approach the problem
+G = how to implement a feature of the question
+O = anything else"""
+    return prompt
+
 def conceptual_doubt_prompt():
     prompt  = f"""
 #Role
@@ -283,6 +300,33 @@ Remember that your task is to only find the files not to solve the issue. Only r
 
     return prompt
 
+def get_fixer_prompt(edit_suggestion):
+    prompt = f"""
+You are a software engineer assigned to fix an issue in a React project. Another developer already investigated the issue:
+{edit_suggestion}
+
+Your workflow will follow a thought-action-observation framework:
+
+Formulate a thought about the change needed. The valid actions are:
+
+"<read>": Takes a relative file path as input to read the contents of the file. Always use relative path like "./workspace/path"
+"<edit>": Takes a relative file path and the complete new content of that file, and replaces the file with it.
+"<add>": Takes a relative file path and the content of a new file to create.
+"<done>": Takes a short explanation of the fix for the student as input to terminate the process.
+
+Then wait for me till I share observation of your action.
+
+Read the suggested files first, edit only what the issue needs and keep the rest of the code unchanged.
+The output of your process should be provided in the following JSON format:
+{{
+"thought": "...",
+"action": "...",
+"action_input": {{"file_location": "", "file_content": ""}}
+}}
+For "<done>" the action_input is {{"explanation": "..."}}. Only return the response in specificed format nothing else """
+
+    return prompt
+
 def get_test_cases_qr_v0_prompt():
     prompt = f"""
 You are an SENIOR MERN stack developer. Your role is to assist user with their React project according to the instructions provided.
@@ -553,4 +597,30 @@ Hope it solved you query, Feel free to reach out to us if you have any other que
 ```
  """
 
-    return prompt
\ No newline at end of file
+    return prompt
+
+def get_failure_signature_explanation_prompt():
+    prompt = f"""
+You are an SENIOR MERN stack developer writing a reusable answer for students of one React assignment.
+
+## Input
+You will receive:
+1. The question details of the assignment.
+2. A combination of test cases that many students fail together, with the source of each test.
+
+## Task
+Explain the most likely mistakes that make exactly this combination of tests fail, without seeing the student's code:
+- For every failing test, state what the test checks and the usual reason it fails.
+- Point to the requirement in the question details (route, element, text, API call) the test depends on.
+- Give the student concrete steps to verify and fix their code. Do not write the full solution.
+
+## Output Format
+```
+Hi,
+
+<For each failing test: what it checks, the common mistake, how to fix it>
+
+Hope it solved you query, Feel free to reach out to us if you have any other questions. Mark the discussion as clarified if your issue is resolved.
+```
+"""
+    return prompt
@@ -0,0 +1,329 @@
+# query_classifier.py
+
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import threading
+
+from metrics import register_gauge
+from constants import (
+    QUERY_CATEGORIES,
+    TEST_CASE_FAILURES,
+    CODE_PUBLISHING_ISSUE,
+    IDE_ISSUE,
+    FIX_SPECIFIC_ERRORS,
+    CATEGORY_CODES,
+    OTHER,
+)
+
+logger = logging.getLogger(__name__)
+
+FAST_PATH_THRESHOLD = float(os.getenv("FAST_PATH_THRESHOLD", "0.85"))
+FAST_PATH_MODEL_PATH = os.getenv("FAST_PATH_MODEL_PATH", "query_classifier_model.json")
+# Fraction of fast-path hits that are still sent to the LLM to measure agreement.
+FAST_PATH_SHADOW_RATE = float(os.getenv("FAST_PATH_SHADOW_RATE", "0"))
+# JSONL file the router appends (query, category) pairs to; empty disables logging.
+CLASSIFICATION_LOG_PATH = os.getenv("CLASSIFICATION_LOG_PATH", "")
+# Output cap of the LLM classification call; the compact contract needs far less
+CLASSIFICATION_MAX_TOKENS = int(os.getenv("CLASSIFICATION_MAX_TOKENS", "120"))
+# The answer is one line of JSON, so generation can stop at the first newline after it. Only after
+# the closing brace: models that think or open a code fence first emit blank lines before the JSON
+CLASSIFICATION_STOP = ["}\n"]
+# Fields of the compact contract that must be present before the answer is accepted
+CLASSIFICATION_REQUIRED_FIELDS = ("c", "s")
+
+# (pattern, category, confidence) - checked in order, first match wins.
+KEYWORD_RULES = [
+    (r"\btest ?cases?\b.*\b(fail\w*|not pass\w*|not satisf\w*)", TEST_CASE_FAILURES, 0.92),
+    (r"\b(fail\w*|not pass\w*)\b.*\btest ?cases?\b", TEST_CASE_FAILURES, 0.92),
+    (r"\bccbp\s+submit\b", CODE_PUBLISHING_ISSUE, 0.95),
+    (r"\bccbp\s+publish\b|\bpublish(ed|ing)?\b|\bsurge\b", CODE_PUBLISHING_ISSUE, 0.9),
+    (r"\b(module not found|cannot find module|syntax ?error|typeerror|referenceerror)\b", FIX_SPECIFIC_ERRORS, 0.88),
+    (r"\bterminal\b|\bnpm (start|install|i)\b|\bpnpm\b|\bnode_modules\b|\bport \d+\b", IDE_ISSUE, 0.86),
+]
+_COMPILED_RULES = [(re.compile(pattern, re.IGNORECASE), category, confidence)
+                   for pattern, category, confidence in KEYWORD_RULES]
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text):
+    """Lowercased unigram and bigram features for a query."""
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class LinearQueryModel:
+    """Multinomial logistic regression over sparse bag-of-words features."""
+
+    def __init__(self, classes=None, weights=None, bias=None):
+        self.classes = classes or list(QUERY_CATEGORIES)
+        self.weights = weights or {c: {} for c in self.classes}
+        self.bias = bias or {c: 0.0 for c in self.classes}
+
+    def _scores(self, features):
+        scores = {}
+        for c in self.classes:
+            w = self.weights[c]
+            scores[c] = self.bias[c] + sum(w.get(f, 0.0) for f in features)
+        return scores
+
+    def predict_proba(self, text):
+        scores = self._scores(tokenize(text))
+        top = max(scores.values())
+        exps = {c: math.exp(s - top) for c, s in scores.items()}
+        total = sum(exps.values())
+        return {c: e / total for c, e in exps.items()}
+
+    @classmethod
+    def train(cls, pairs, epochs=15, learning_rate=0.3, l2=1e-4, seed=0):
+        """Fit the model with SGD on (query, category) pairs."""
+        classes = sorted({category for _, category in pairs} | set(QUERY_CATEGORIES))
+        model = cls(classes=classes)
+        samples = [(tokenize(query), category) for query, category in pairs]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(samples)
+            lr = learning_rate / (1 + epoch)
+            for features, label in samples:
+                scores = model._scores(features)
+                top = max(scores.values())
+                exps = {c: math.exp(s - top) for c, s in scores.items()}
+                total = sum(exps.values())
+                for c in classes:
+                    grad = exps[c] / total - (1.0 if c == label else 0.0)
+                    if abs(grad) < 1e-6:
+                        continue
+                    w = model.weights[c]
+                    for f in features:
+                        w[f] = w.get(f, 0.0) * (1 - lr * l2) - lr * grad
+                    model.bias[c] -= lr * grad
+        return model
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"classes": self.classes, "weights": self.weights, "bias": self.bias}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(classes=data["classes"], weights=data["weights"], bias=data["bias"])
+
+
+class FastPathClassifier:
+    """Keyword rules plus an optional linear model, used ahead of the LLM router."""
+
+    def __init__(self, model=None, threshold=FAST_PATH_THRESHOLD):
+        self.model = model
+        self.threshold = threshold
+
+    def predict(self, text):
+        """
+        Returns (category, confidence, source) for the query text.
+        source is "rule" or "model"; category is None when nothing applies.
+        """
+        for pattern, category, confidence in _COMPILED_RULES:
+            if pattern.search(text):
+                return category, confidence, "rule"
+        if self.model is not None and text.strip():
+            probs = self.model.predict_proba(text)
+            category = max(probs, key=probs.get)
+            return category, probs[category], "model"
+        return None, 0.0, None
+
+    def is_confident(self, confidence):
+        return confidence >= self.threshold
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_fast_path_classifier():
+    """Load the shared classifier once, with the trained model if one exists."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            model = None
+            if FAST_PATH_MODEL_PATH and os.path.isfile(FAST_PATH_MODEL_PATH):
+                try:
+                    model = LinearQueryModel.load(FAST_PATH_MODEL_PATH)
+                    logger.info(f"Loaded fast-path model from {FAST_PATH_MODEL_PATH}")
+                except Exception as e:
+                    logger.warning(f"Failed to load fast-path model: {str(e)}")
+            _classifier = FastPathClassifier(model=model)
+        return _classifier
+
+
+def should_shadow():
+    return FAST_PATH_SHADOW_RATE > 0 and random.random() < FAST_PATH_SHADOW_RATE
+
+
+# ---------------------- Metrics ----------------------
+
+_stats_lock = threading.Lock()
+_log_lock = threading.Lock()
+_stats = {"queries": 0, "fast_path_hits": 0, "llm_calls": 0, "compared": 0, "agreed": 0}
+
+
+def record_classification(fast_path_hit, fast_category=None, llm_category=None):
+    """
+    Count one classification and, when both answers exist, whether they agree.
+    fast_category is only passed for confident fast-path answers the LLM shadowed,
+    the ones that would have been used.
+    """
+    with _stats_lock:
+        _stats["queries"] += 1
+        if fast_path_hit:
+            _stats["fast_path_hits"] += 1
+        if llm_category is not None:
+            _stats["llm_calls"] += 1
+            if fast_category is not None:
+                _stats["compared"] += 1
+                if fast_category.strip().lower() == llm_category.strip().lower():
+                    _stats["agreed"] += 1
+
+
+def get_fast_path_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["hit_rate"] = stats["fast_path_hits"] / stats["queries"] if stats["queries"] else 0.0
+    stats["agreement"] = stats["agreed"] / stats["compared"] if stats["compared"] else None
+    return stats
+
+
+register_gauge("fast_path_hit_rate", "Share of classifications answered by the local fast path.",
+               lambda: get_fast_path_stats()["hit_rate"])
+register_gauge("fast_path_llm_agreement", "Share of compared classifications where fast path and LLM agree.",
+               lambda: get_fast_path_stats()["agreement"])
+
+
+# ---------------------- LLM classification contract ----------------------
+
+_STRING_RE = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_LITERAL_RE = re.compile(r"-?\d+(?:\.\d+)?|true|false|null")
+
+
+def parse_partial_json(text):
+    """
+    Key/value pairs of the first JSON object in text that are already complete.
+
+    Tolerates code fences or prose around the object, a missing closing brace
+    (the stop sequence cuts it off) and a value still being generated, which is
+    simply left out. Only flat objects with string, number and literal values
+    are understood, which is all the classification contract uses.
+    """
+    start = text.find("{")
+    if start == -1:
+        return {}
+    fields = {}
+    pos = start + 1
+    while True:
+        key_match = _STRING_RE.search(text, pos)
+        if key_match is None:
+            break
+        colon = text.find(":", key_match.end())
+        if colon == -1 or text[key_match.end():colon].strip():
+            break
+        value_start = colon + 1
+        while value_start < len(text) and text[value_start] in " \t\r\n":
+            value_start += 1
+        if value_start >= len(text):
+            break
+        if text[value_start] == '"':
+            value_match = _STRING_RE.match(text, value_start)
+            if value_match is None:
+                break  # string value still streaming
+            try:
+                value = json.loads(value_match.group(0))
+            except ValueError:
+                value = value_match.group(1)
+        else:
+            value_match = _LITERAL_RE.match(text, value_start)
+            if value_match is None or value_match.end() == len(text):
+                break  # unknown or possibly unfinished literal
+            value = json.loads(value_match.group(0))
+        fields[key_match.group(1)] = value
+        pos = value_match.end()
+        rest = text[pos:].lstrip()
+        if not rest.startswith(","):
+            break
+        pos = text.index(",", pos) + 1
+    return fields
+
+
+def classification_complete(text):
+    """Whether a streamed classification answer already has every required field."""
+    fields = parse_partial_json(text)
+    return all(field in fields for field in CLASSIFICATION_REQUIRED_FIELDS)
+
+
+def parse_classification(text):
+    """
+    Decode a compact classification answer.
+
+    Returns:
+        tuple: (category, summary, error description); the category is None when the code is
+        missing or unknown, and callers fall back to OTHER.
+    """
+    fields = parse_partial_json(text)
+    code = str(fields.get("c", "")).strip().upper()[:1]
+    category = CATEGORY_CODES.get(code)
+    if category is None:
+        logger.warning(f"Unparseable classification answer, falling back to '{OTHER}': {text[:200]!r}")
+    return category, str(fields.get("s", "")).strip(), str(fields.get("e", "")).strip()
+
+
+def log_labelled_query(query_text, category):
+    """Append a (query, category) pair for offline training."""
+    if not CLASSIFICATION_LOG_PATH:
+        return
+    try:
+        with _log_lock, open(CLASSIFICATION_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"query": query_text, "category": category}) + "\n")
+    except Exception as e:
+        logger.warning(f"Failed to log classification: {str(e)}")
+
+
+def load_labelled_queries(path):
+    pairs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            pairs.append((record["query"], record["category"].strip()))
+    return pairs
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("train", "evaluate"):
+        print("Usage: python query_classifier.py train <labelled.jsonl> [model.json]")
+        print("       python query_classifier.py evaluate <labelled.jsonl> [model.json]")
+        sys.exit(1)
+
+    command, data_path = sys.argv[1], sys.argv[2]
+    model_path = sys.argv[3] if len(sys.argv) > 3 else FAST_PATH_MODEL_PATH
+    pairs = load_labelled_queries(data_path)
+
+    if command == "train":
+        model = LinearQueryModel.train(pairs)
+        model.save(model_path)
+        print(f"Trained on {len(pairs)} queries, saved model to {model_path}")
+    else:
+        classifier = FastPathClassifier(model=LinearQueryModel.load(model_path))
+        hits = correct = 0
+        for query, category in pairs:
+            predicted, confidence, _ = classifier.predict(query)
+            if classifier.is_confident(confidence):
+                hits += 1
+                correct += predicted == category
+        print(f"Queries: {len(pairs)}")
+        print(f"Fast-path hit rate: {hits / max(len(pairs), 1):.2%}")
+        print(f"Fast-path precision: {correct / max(hits, 1):.2%}")
@@ -0,0 +1,137 @@
+# question_context.py
+
+import collections
+import logging
+import os
+import re
+
+from chat_history import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# A line found in at least this share of the catalog's questions is boilerplate and dropped
+BOILERPLATE_SHARE = float(os.getenv("QUESTION_BOILERPLATE_SHARE", "0.5"))
+
+# Sections that only carry visuals, styling or set-up steps every project shares
+DROPPED_HEADINGS = re.compile(r"^(design files|set up instructions|quick tips|refer to .*below:?)$", re.I)
+DROPPED_SUMMARIES = re.compile(r"^(colors|font-families|components structure|.*design files)$", re.I)
+
+MEDIA_FILE = r"\.(png|jpe?g|gif|svg|webp|mp4|webm|mov)(\?[^)\s]*)?"
+
+_VIDEO = re.compile(r"<video\b.*?</video>", re.I | re.S)
+_IMG = re.compile(r"<img\b[^>]*>", re.I)
+_MARKDOWN_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_MEDIA_LINK = re.compile(r"\[([^\]]*)\]\((https?://[^)\s]+" + MEDIA_FILE + r")\)", re.I)
+_SUMMARY = re.compile(r"<summary>(.*?)</summary>", re.I | re.S)
+_TAG = re.compile(r"</?(a|b|i|div|span|br|hr|p|center|details|source|iframe)\b[^>]*>", re.I)
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def _drop_sections(text):
+    """Remove the ### sections and <details> blocks listed in DROPPED_HEADINGS / DROPPED_SUMMARIES."""
+    kept = []
+    for block in re.split(r"(?m)^(?=#{2,3} )", text):
+        heading = block.split("\n", 1)[0].lstrip("#").strip()
+        if block.startswith("#") and DROPPED_HEADINGS.match(heading):
+            continue
+        kept.append(block)
+    text = "".join(kept)
+
+    def details(match):
+        summary = _SUMMARY.search(match.group(0))
+        if summary and DROPPED_SUMMARIES.match(summary.group(1).strip()):
+            return ""
+        return match.group(0)
+
+    return re.sub(r"<details>.*?</details>", details, text, flags=re.I | re.S)
+
+
+def _summary_label(match):
+    label = match.group(1).strip()
+    return "" if label.lower().startswith("click to view") else f"**{label}**"
+
+
+def _strip_markup(text):
+    text = _VIDEO.sub("", text)
+    text = _IMG.sub("", text)
+    text = _MARKDOWN_IMAGE.sub("", text)
+
+    # links to screenshots/videos keep their label; a link whose label is the URL itself is an
+    # asset the app has to use (e.g. "Image URLs") and stays as the bare URL
+    def media_link(match):
+        label, url = match.group(1), match.group(2)
+        return url if label.strip() == url else label
+
+    text = _MEDIA_LINK.sub(media_link, text)
+    text = _SUMMARY.sub(_summary_label, text)
+    text = _TAG.sub("", text)
+    return text
+
+
+def _tidy(text):
+    lines, seen = [], set()
+    in_code = False
+    for line in text.splitlines():
+        line = line.rstrip()
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        elif not in_code and line.lstrip().startswith("- "):
+            # the same bullet repeated within a question says nothing new
+            if line.strip() in seen:
+                continue
+            seen.add(line.strip())
+        lines.append(line)
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def compact_question_content(content, boilerplate=frozenset()):
+    """
+    question_content without media, HTML markup, design-file lists, styling
+    hints and the given boilerplate lines.
+    """
+    if not content:
+        return ""
+    text = _strip_markup(_drop_sections(content))
+    if boilerplate:
+        text = "\n".join(line for line in text.splitlines() if line.strip() not in boilerplate)
+    return _tidy(text)
+
+
+def _is_structural(line):
+    # headings and bold labels give the remaining text its meaning, even when every question has them
+    return not line or line.startswith(("#", "**", "```"))
+
+
+def find_boilerplate(contents, share=BOILERPLATE_SHARE):
+    """Lines that occur in at least `share` of the questions."""
+    contents = [c for c in contents if c]
+    if len(contents) < 2:
+        return frozenset()
+    counts = collections.Counter()
+    for content in contents:
+        counts.update({line.strip() for line in _strip_markup(_drop_sections(content)).splitlines()})
+    threshold = share * len(contents)
+    return frozenset(line for line, n in counts.items() if n >= threshold and not _is_structural(line))
+
+
+class QuestionContext:
+    """Compact question content and its estimated token count."""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = estimate_tokens(text)
+
+
+def build_question_contexts(questions, boilerplate=None):
+    """Compact context for every catalog question; boilerplate is detected across all of them unless given."""
+    if boilerplate is None:
+        boilerplate = find_boilerplate([q.question_content for q in questions])
+    contexts = {}
+    raw_tokens = compact_tokens = 0
+    for question in questions:
+        context = QuestionContext(compact_question_content(question.question_content, boilerplate))
+        contexts[question.question_command_id.lower()] = context
+        raw_tokens += estimate_tokens(question.question_content)
+        compact_tokens += context.tokens
+    logger.info(f"Compacted question content of {len(contexts)} questions from ~{raw_tokens} to ~{compact_tokens} tokens")
+    return contexts
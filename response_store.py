@@ -0,0 +1,150 @@
+# response_store.py
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import count
+from singleflight import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Empty disables the store
+RESPONSE_DB_PATH = os.getenv("RESPONSE_DB_PATH", "responses.db")
+RESPONSE_TTL_SECONDS = int(os.getenv("RESPONSE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESPONSE_MAX_ROWS = int(os.getenv("RESPONSE_MAX_ROWS", "10000"))
+RESPONSE_MAX_BYTES = int(os.getenv("RESPONSE_MAX_BYTES", str(100 * 1024 * 1024)))
+# Bump whenever prompts, models or the bot logic change so stale answers are not replayed
+PIPELINE_VERSION = os.getenv("PIPELINE_VERSION", "1")
+
+
+# Replies given when the deadline ran out or the LLM call failed; a retry may well get a real answer
+DEGRADED_RESPONSE_PREFIXES = ("<mentor_required>", "Error:")
+
+
+def is_storable(body, status):
+    """Only real answers are stored or shared with identical requests, not escalations after a timeout or LLM errors."""
+    response = body.get("response")
+    return status == 200 and isinstance(response, str) and not response.startswith(DEGRADED_RESPONSE_PREFIXES)
+
+
+def response_key(question_command_id, code_hash, query, pipeline_version=PIPELINE_VERSION):
+    digest = hashlib.sha256()
+    query_hash = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+    for part in (question_command_id, code_hash, query_hash, pipeline_version):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseStore:
+    """
+    Completed bot responses on local disk, keyed by (question_command_id,
+    code hash, query hash, pipeline version), with optional client supplied
+    idempotency keys pointing at them. Bounded by age, row count and size.
+    """
+
+    def __init__(self, db_path=RESPONSE_DB_PATH, ttl_seconds=RESPONSE_TTL_SECONDS,
+                 max_rows=RESPONSE_MAX_ROWS, max_bytes=RESPONSE_MAX_BYTES):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    question_command_id TEXT NOT NULL,
+                    pipeline_version TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    idempotency_key TEXT PRIMARY KEY,
+                    response_key TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )""")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _row_to_result(self, row):
+        if row is None or row[2] < time.time() - self.ttl_seconds:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def get(self, key):
+        """The stored (body, status) for a response key, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT body, status, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        result = self._row_to_result(row)
+        count("response_store", outcome="hit" if result else "miss")
+        return result
+
+    def get_by_idempotency_key(self, idempotency_key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT r.body, r.status, r.created_at FROM idempotency_keys i "
+                "JOIN responses r ON r.key = i.response_key WHERE i.idempotency_key = ?",
+                (idempotency_key,)).fetchone()
+        return self._row_to_result(row)
+
+    def link(self, idempotency_key, key):
+        """Point an idempotency key at a stored response."""
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO idempotency_keys (idempotency_key, response_key, created_at) "
+                         "VALUES (?, ?, ?)", (idempotency_key, key, time.time()))
+
+    def put(self, key, question_command_id, body, status, idempotency_key=None):
+        payload = json.dumps(body)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, question_command_id, pipeline_version, body, status, size, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, question_command_id, PIPELINE_VERSION, payload, status, len(payload), now))
+        if idempotency_key:
+            self.link(idempotency_key, key)
+        self.evict()
+
+    def evict(self):
+        """Drop expired responses, then the oldest ones until the row and size caps hold."""
+        with self._connect() as conn:
+            cutoff = time.time() - self.ttl_seconds
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+            conn.execute("DELETE FROM idempotency_keys WHERE created_at < ?", (cutoff,))
+            rows, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if rows > self.max_rows or size > self.max_bytes:
+                # oldest first; keep the newest rows whose running size fits under the byte cap
+                conn.execute(
+                    "DELETE FROM responses WHERE key NOT IN ("
+                    "  SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY created_at DESC) AS running "
+                    "                   FROM responses ORDER BY created_at DESC LIMIT ?) WHERE running <= ?)",
+                    (self.max_rows, self.max_bytes))
+                conn.execute("DELETE FROM idempotency_keys WHERE response_key NOT IN (SELECT key FROM responses)")
+                logger.info(f"Evicted stored responses down to {self.max_rows} rows / {self.max_bytes} bytes")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_response_store():
+    """The process-wide store, or None when RESPONSE_DB_PATH is empty."""
+    global _store
+    if not RESPONSE_DB_PATH:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ResponseStore()
+        return _store
@@ -1,8 +1,16 @@
 
 from helpers import parse_html_to_dict
 from helpers import download_image,encode_image_to_base64,llm_call_with_image
-from prompts import get_query_classification_prompt
-import json
+from prompts import get_compact_query_classification_prompt
+from query_classifier import (get_fast_path_classifier, should_shadow, record_classification, log_labelled_query,
+                              parse_classification, classification_complete,
+                              CLASSIFICATION_MAX_TOKENS, CLASSIFICATION_STOP)
+from constants import OTHER
+from metrics import timed, set_query_category
+from model_routing import CLASSIFY_QUERY
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class QueryRouter: 
@@ -13,27 +21,63 @@ class QueryRouter:
         self.updated_query_context = ""
     
     def parse_query(self):
-        text, imgs = parse_html_to_dict(self.query)
+        with timed("parse_html", query_chars=len(self.query)):
+            text, imgs = parse_html_to_dict(self.query)
         image_strings = []
         
-        for img in imgs:
-            image_path = download_image(img)
-            image_base64,image_format = encode_image_to_base64(image_path)
-            image_strings.append({"extension": image_format,"content": image_base64})
+        with timed("image_download", images=len(imgs)):
+            for img in imgs:
+                image_path = download_image(img)
+                image_base64,image_format = encode_image_to_base64(image_path)
+                image_strings.append({"extension": image_format,"content": image_base64})
         self.query_text  = text
         self.query_imgs = image_strings
 
     
     def classify_query(self):
+        with timed("classify") as span:
+            category = self._classify_query(span)
+        return category
+
+    def _classify_query(self, span):
         self.parse_query()
-        result = llm_call_with_image(get_query_classification_prompt(),self.query_text,self.query_imgs)
+        classifier = get_fast_path_classifier()
+        fast_category, confidence, source = (None, 0.0, None)
+        if not self.query_imgs:
+            # Screenshots carry the actual error, so only text-only queries take the fast path
+            fast_category, confidence, source = classifier.predict(self.query_text)
+
+        if fast_category and classifier.is_confident(confidence) and not should_shadow():
+            logger.info(f"Fast-path classification ({source}, {confidence:.2f}): {fast_category}")
+            self.updated_query_context = f"Query Summary:  {self.query_text}"
+            record_classification(fast_path_hit=True)
+            span["source"] = source
+            set_query_category(fast_category)
+            return fast_category
+
+        # compact contract: one-letter code, capped output, and the stream ends as soon as the fields are in
+        result = llm_call_with_image(get_compact_query_classification_prompt(),self.query_text,self.query_imgs,
+                                     stage=CLASSIFY_QUERY,
+                                     params={"max_tokens": CLASSIFICATION_MAX_TOKENS, "stop": CLASSIFICATION_STOP},
+                                     until=classification_complete)
         print(result)
-        res_json = json.loads(result.replace("```json","").replace("```",""))
-        if "error_description" in res_json and res_json['error_description'] != "":
-            self.updated_query_context = f"Query Summary:  {res_json['user_query_summary']}, Error Description: {res_json['error_description']}"
+        category, summary, error_description = parse_classification(result)
+        parsed = category is not None
+        category = category or OTHER
+        summary = summary or self.query_text
+        if error_description != "":
+            self.updated_query_context = f"Query Summary:  {summary}, Error Description: {error_description}"
         else :
-            self.updated_query_context = f"Query Summary:  {res_json['user_query_summary']}"
-        return res_json['query_category']
+            self.updated_query_context = f"Query Summary:  {summary}"
+        # agreement only means something for fast-path answers that were confident enough to be used,
+        # and a fallback to "other" is neither an answer to compare against nor a training label
+        shadowed = fast_category if parsed and fast_category and classifier.is_confident(confidence) else None
+        record_classification(fast_path_hit=False, fast_category=shadowed, llm_category=category)
+        if not self.query_imgs and parsed:
+            log_labelled_query(self.query_text, category)
+        span["source"] = "llm"
+        set_query_category(category)
+        return category
 
 
 
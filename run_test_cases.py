@@ -1,7 +1,11 @@
 # run_test_cases.py
 
 import subprocess
+from metrics import timed
+from deadline import DeadlineExceeded, run_command
+from failure_signatures import log_test_results
 
+@timed("test_run")
 def run_test_case_script(container_name, question_id):
     """
     Runs test cases inside the specified Docker container.
@@ -16,14 +20,17 @@ def run_test_case_script(container_name, question_id):
     try:
         # Example command to run tests, adjust according to your testing framework
         test_command = f"docker exec {container_name} python /path/to/test_script.py {question_id}"
-        result = subprocess.run(test_command, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        result = run_command(test_command, "test_run", check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         
         # Parse the test results from stdout
         # This is highly dependent on how your test script outputs results
         # For demonstration, assume it returns JSON
         import json
         test_results = json.loads(result.stdout)
+        log_test_results(question_id, test_results)
         return test_results
+    except DeadlineExceeded:
+        raise
     except subprocess.CalledProcessError as e:
         print(f"Test execution failed: {e.stderr}")
         return {"failed": ["Test execution failed"]}
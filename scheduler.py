@@ -0,0 +1,142 @@
+# scheduler.py
+
+import logging
+import os
+import threading
+
+from constants import is_container_bound
+from metrics import timed, count, register_gauge
+from deadline import DeadlineExceeded, budget, check_deadline
+
+logger = logging.getLogger(__name__)
+
+FAST_LANE = "fast"
+DOCKER_LANE = "docker"
+
+# Requests answered with a single LLM call (IDE issue, conceptual doubts, publishing, ...)
+FAST_LANE_CONCURRENCY = int(os.getenv("FAST_LANE_CONCURRENCY", "8"))
+# Requests that extract the code into a container. The v0 bot copies into a fixed container through the
+# shared ./workspace, so more than one at a time would overwrite each other's code
+DOCKER_LANE_CONCURRENCY = int(os.getenv("DOCKER_LANE_CONCURRENCY", "1"))
+# Docker-bound requests allowed to wait for a slot before new ones are rejected,
+# so they cannot tie up every web worker thread while fast queries queue behind them
+DOCKER_LANE_MAX_WAITING = int(os.getenv("DOCKER_LANE_MAX_WAITING", "4"))
+
+
+class LaneFullError(Exception):
+    """Raised when a lane already has its maximum number of waiting requests."""
+
+    def __init__(self, lane):
+        super().__init__(f"The {lane.name} lane is full ({lane.in_flight} running, {lane.waiting} waiting)")
+        self.lane = lane
+
+
+class Lane:
+    """A concurrency limit for one class of requests."""
+
+    def __init__(self, name, concurrency, max_waiting=None):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        register_gauge(f"lane_{name}_in_flight", f"Requests running in the {name} lane", lambda: self.in_flight)
+        register_gauge(f"lane_{name}_waiting", f"Requests waiting for the {name} lane", lambda: self.waiting)
+
+    def run(self, fn, reject_when_full=True, timeout=None):
+        """
+        Run fn() once a slot is free.
+
+        Args:
+            reject_when_full (bool): Raise LaneFullError instead of queueing past max_waiting.
+            timeout (float): Seconds to wait for a slot before raising TimeoutError.
+        """
+        with self._lock:
+            if reject_when_full and self.max_waiting is not None and self.waiting >= self.max_waiting:
+                count("lane_rejections", lane=self.name)
+                raise LaneFullError(self)
+            self.waiting += 1
+        try:
+            with timed("lane_wait", lane=self.name):
+                acquired = self._slots.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            check_deadline(f"{self.name}_lane")
+            raise TimeoutError(f"No slot in the {self.name} lane within {timeout}s")
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+
+class Scheduler:
+    """
+    Classifies a query first, then answers it in the lane its category needs,
+    so single-call answers never queue behind container-bound ones.
+    """
+
+    def __init__(self, fast_concurrency=FAST_LANE_CONCURRENCY, docker_concurrency=DOCKER_LANE_CONCURRENCY,
+                 docker_max_waiting=DOCKER_LANE_MAX_WAITING):
+        self.lanes = {
+            FAST_LANE: Lane(FAST_LANE, fast_concurrency),
+            DOCKER_LANE: Lane(DOCKER_LANE, docker_concurrency, docker_max_waiting),
+        }
+        logger.info(f"Scheduler lanes: fast={fast_concurrency}, docker={docker_concurrency} "
+                    f"(max waiting {docker_max_waiting})")
+
+    def lane_for(self, category):
+        return self.lanes[DOCKER_LANE if is_container_bound(category) else FAST_LANE]
+
+    def run(self, qrbot, prepare=None, reject_when_full=True):
+        """
+        Answer a QRBot query through its lane.
+
+        Args:
+            qrbot: An ide_qr_bot_v0.QRBot.
+            prepare (callable): Container setup, run inside the docker lane only, and
+                only when qrbot.lookup() has no stored answer.
+            reject_when_full (bool): See Lane.run; job workers pass False and wait instead.
+
+        Raises:
+            LaneFullError: If the lane for the query's category is saturated.
+        """
+        with timed("bot_response"):
+            category = qrbot.classify()
+            if category == "other":
+                return "<mentor_required>"
+            # answered from a failure signature or an earlier near-identical submission: no lane, no setup
+            cached = qrbot.lookup()
+            if cached is not None:
+                return cached
+            lane = self.lane_for(category)
+
+            def respond():
+                if prepare and lane.name == DOCKER_LANE:
+                    prepare()
+                return qrbot.respond()
+
+            try:
+                return lane.run(respond, reject_when_full=reject_when_full, timeout=budget(f"{lane.name}_lane"))
+            except DeadlineExceeded:
+                return "<mentor_required>"
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
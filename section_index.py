@@ -0,0 +1,162 @@
+# section_index.py
+
+import collections
+import logging
+import math
+import os
+import re
+import threading
+
+from catalog import get_catalog, add_reload_listener
+from chat_history import estimate_tokens
+from metrics import count
+
+logger = logging.getLogger(__name__)
+
+# Sections of the question context sent for an implementation-guidance query
+SECTION_TOP_K = int(os.getenv("SECTION_TOP_K", "3"))
+# Below this best BM25 score the query matched nothing in particular and the full context is sent
+SECTION_MIN_SCORE = float(os.getenv("SECTION_MIN_SCORE", "3.0"))
+# Question contexts shorter than this (estimated tokens) are always sent in full
+SECTION_INDEX_MIN_TOKENS = int(os.getenv("SECTION_INDEX_MIN_TOKENS", "1200"))
+# Longer sections are split at their top-level bullets ("- **Home Route**", ...) into chunks of about this size
+SECTION_MAX_TOKENS = int(os.getenv("SECTION_MAX_TOKENS", "300"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have how i in is it its my of on or that the this to was were will with
+should when then page user what why not do does can you your me we our but if so
+""".split())
+
+# A section starts at a ##/### heading or at a bold <summary> label on its own line
+_SECTION_START = re.compile(r"(?m)^(?=#{2,3} |\*\*[^*\n]+\*\*\s*$)")
+_TOP_LEVEL_ITEM = re.compile(r"(?m)^(?=- )")
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase word tokens; camelCase names are split as well so "VideoItemDetails" matches "video item details"."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _split_long_section(section, max_tokens):
+    """Chunks of a long section, each starting with the section's heading line so it still reads in context."""
+    heading, _, body = section.partition("\n")
+    items = [item.strip() for item in _TOP_LEVEL_ITEM.split(body) if item.strip()]
+    chunks, current = [], []
+    for item in items:
+        if current and estimate_tokens("\n".join(current + [item])) > max_tokens:
+            chunks.append(current)
+            current = []
+        current.append(item)
+    if current:
+        chunks.append(current)
+    return [heading + "\n\n" + "\n".join(chunk) for chunk in chunks]
+
+
+def split_sections(text, max_tokens=SECTION_MAX_TOKENS):
+    sections = []
+    for section in _SECTION_START.split(text or ""):
+        section = section.strip()
+        if not section:
+            continue
+        if estimate_tokens(section) > max_tokens:
+            sections.extend(_split_long_section(section, max_tokens))
+        else:
+            sections.append(section)
+    return sections
+
+
+class QuestionSections:
+    """One question's context split into sections, with their term frequencies."""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.sections = split_sections(text)
+        self.term_freqs = [collections.Counter(tokenize(s)) for s in self.sections]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+
+
+class SectionIndex:
+    """
+    BM25 over the sections of every question's compact context. Document
+    frequencies are counted across the whole catalog so that terms every
+    question shares ("route", "component") weigh little even in questions
+    with only a handful of sections.
+    """
+
+    def __init__(self, contexts):
+        """contexts: {question_command_id: compact question context}"""
+        self.questions = {key.lower(): QuestionSections(text) for key, text in contexts.items() if text}
+        doc_freq = collections.Counter()
+        lengths = []
+        for question in self.questions.values():
+            for tf in question.term_freqs:
+                doc_freq.update(tf.keys())
+            lengths.extend(question.lengths)
+        self.doc_count = len(lengths)
+        self.avg_length = sum(lengths) / len(lengths) if lengths else 0
+        self.idf = {term: math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+        logger.info(f"Indexed {self.doc_count} sections of {len(self.questions)} questions")
+
+    def _score(self, query_terms, tf, length):
+        score = 0.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_length)
+        for term in query_terms:
+            freq = tf.get(term)
+            if freq:
+                score += self.idf.get(term, 0) * freq * (BM25_K1 + 1) / (freq + norm)
+        return score
+
+    def search(self, question_command_id, query, top_k=SECTION_TOP_K):
+        """[(score, section index)] of one question, best first."""
+        question = self.questions.get(str(question_command_id).strip().lower())
+        if question is None:
+            return []
+        query_terms = set(tokenize(query))
+        scores = [(self._score(query_terms, tf, length), i)
+                  for i, (tf, length) in enumerate(zip(question.term_freqs, question.lengths))]
+        return sorted(scores, reverse=True)[:top_k]
+
+    def relevant_context(self, question_command_id, query, top_k=SECTION_TOP_K, min_score=SECTION_MIN_SCORE):
+        """
+        The question's intro and its top_k sections for the query in
+        document order, or None when the full context should be sent instead
+        (short question, unknown question or no section scoring min_score).
+        """
+        question = self.questions.get(str(question_command_id).strip().lower())
+        if question is None or question.tokens < SECTION_INDEX_MIN_TOKENS or len(question.sections) <= top_k + 1:
+            return None
+        hits = self.search(question_command_id, query, top_k)
+        if not hits or hits[0][0] < min_score:
+            count("question_sections", outcome="low_score")
+            return None
+        selected = {i for score, i in hits if score > 0}
+        selected.add(0)  # the intro names the project
+        count("question_sections", outcome="top_k")
+        return "\n\n".join(question.sections[i] for i in sorted(selected))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _rebuild(catalog):
+    global _index
+    # runs inside the catalog's reload, so read its index directly instead of catalog.questions()
+    _index = SectionIndex({key: q.question_context for key, q in catalog.by_command_id.items()})
+
+
+def get_section_index():
+    """The index of the loaded catalog; rebuilt whenever the catalog is reloaded."""
+    with _index_lock:
+        if _index is None:
+            catalog = get_catalog()
+            catalog.version
+            _rebuild(catalog)
+            add_reload_listener(_rebuild)
+        return _index
@@ -0,0 +1,131 @@
+# singleflight.py
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import count
+from deadline import budget
+
+logger = logging.getLogger(__name__)
+
+# Completed results are served to identical requests for this many seconds (0 disables)
+SINGLEFLIGHT_CACHE_SECONDS = float(os.getenv("SINGLEFLIGHT_CACHE_SECONDS", "30"))
+SINGLEFLIGHT_CACHE_SIZE = int(os.getenv("SINGLEFLIGHT_CACHE_SIZE", "256"))
+
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+def hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def request_key(code_hash, question_command_id, query):
+    """Identity of a request: the uploaded bytes (hash_file), the question it is for and the normalized query."""
+    digest = hashlib.sha256()
+    for part in (code_hash, question_command_id, normalize_query(query)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent requests: the first one runs, the others
+    wait for and share its result. Successful results stay cached for a short
+    while so immediate retries are answered without rerunning the pipeline.
+
+    State is per process; with several gunicorn workers a duplicate landing on
+    another worker still runs on its own.
+    """
+
+    def __init__(self, cache_seconds=SINGLEFLIGHT_CACHE_SECONDS, cache_size=SINGLEFLIGHT_CACHE_SIZE):
+        self.cache_seconds = cache_seconds
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._completed = OrderedDict()  # key -> (expires_at, result)
+
+    def _cached(self, key):
+        entry = self._completed.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._completed[key]
+            return None
+        return result
+
+    def do(self, key, fn, cacheable=lambda result: True):
+        """
+        Run fn() once per key at a time and return its result.
+
+        Args:
+            cacheable (callable): Whether a result may be served to later retries.
+
+        Raises:
+            DeadlineExceeded: If this request's deadline passes while waiting on another one.
+        """
+        with self._lock:
+            result = self._cached(key)
+            if result is not None:
+                count("singleflight", outcome="cached")
+                return result
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+
+        if not leader:
+            count("singleflight", outcome="joined")
+            logger.info(f"Joining in-flight request {key[:12]}")
+            while not call.done.wait(budget("singleflight")):
+                pass  # budget() raises once the deadline has passed
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        count("singleflight", outcome="leader")
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if call.error is None and self.cache_seconds > 0 and cacheable(call.result):
+                    self._completed[key] = (time.monotonic() + self.cache_seconds, call.result)
+                    while len(self._completed) > self.cache_size:
+                        self._completed.popitem(last=False)
+            call.done.set()
+
+
+_singleflight = None
+_singleflight_lock = threading.Lock()
+
+
+def get_singleflight():
+    global _singleflight
+    with _singleflight_lock:
+        if _singleflight is None:
+            _singleflight = SingleFlight()
+        return _singleflight
@@ -0,0 +1,166 @@
+# starter_snapshot.py
+
+import difflib
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+
+from catalog import get_catalog
+
+logger = logging.getLogger(__name__)
+
+# One <question_command_id>.json per question: content hash and text of every starter file
+STARTER_SNAPSHOT_DIR = os.getenv("STARTER_SNAPSHOT_DIR", "starter_snapshots")
+# A changed file is sent as a diff only when the diff is at most this share of the file's size
+STARTER_DIFF_MAX_RATIO = float(os.getenv("STARTER_DIFF_MAX_RATIO", "0.5"))
+
+# Same files extract_file_contents_with_tree inlines
+SNAPSHOT_EXTENSIONS = ('.json', '.js', '.ts', '.html', '.css')
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _read_text(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def build_snapshot(starter_dir):
+    """{relative path: {"sha256", "content"}} of the starter files under starter_dir."""
+    files = {}
+    for root, dirs, names in os.walk(starter_dir):
+        if 'node_modules' in dirs:
+            dirs.remove('node_modules')
+        # the hidden test suite is not part of what students start from
+        if '__tests__' in dirs:
+            dirs.remove('__tests__')
+        for name in names:
+            if name.endswith(SNAPSHOT_EXTENSIONS):
+                path = os.path.join(root, name)
+                try:
+                    content = _read_text(path)
+                except UnicodeDecodeError:
+                    continue
+                relative_path = os.path.relpath(path, starter_dir).replace(os.sep, "/")
+                files[relative_path] = {"sha256": _sha256(content), "content": content}
+    return files
+
+
+class StarterSnapshot:
+    """The starter files of one question, matched against a submission by path and content hash."""
+
+    def __init__(self, files):
+        self.files = files
+
+    def find(self, relative_path):
+        """
+        Starter entry for a submission path. Zips are not always rooted at the
+        project folder, so leading directories are dropped until a path matches.
+        """
+        parts = relative_path.replace(os.sep, "/").split("/")
+        for i in range(len(parts)):
+            entry = self.files.get("/".join(parts[i:]))
+            if entry is not None:
+                return "/".join(parts[i:]), entry
+        return None, None
+
+    def describe(self, relative_path, content):
+        """
+        (kind, text) for a submission file: ("unchanged", None), ("diff", unified
+        diff against the starter) or ("full", content) for new or heavily changed files.
+        """
+        starter_path, entry = self.find(relative_path)
+        if entry is None:
+            return "full", content
+        if entry["sha256"] == _sha256(content):
+            return "unchanged", None
+        diff = "\n".join(difflib.unified_diff(
+            entry["content"].splitlines(), content.splitlines(),
+            fromfile=f"starter/{starter_path}", tofile=relative_path, n=2, lineterm=""))
+        if len(diff) <= STARTER_DIFF_MAX_RATIO * len(content):
+            return "diff", diff
+        return "full", content
+
+
+def snapshot_path(question_command_id):
+    return os.path.join(STARTER_SNAPSHOT_DIR, f"{str(question_command_id).strip().lower()}.json")
+
+
+def save_snapshot(question_command_id, starter_dir):
+    files = build_snapshot(starter_dir)
+    os.makedirs(STARTER_SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(question_command_id)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"question_command_id": question_command_id, "starter_dir": starter_dir, "files": files}, f)
+    logger.info(f"Saved starter snapshot of {len(files)} files for {question_command_id} to {path}")
+    return path
+
+
+_snapshots = {}  # question_command_id lower -> (file mtime, StarterSnapshot)
+_snapshots_lock = threading.Lock()
+
+
+def get_starter_snapshot(question_command_id):
+    """
+    The question's starter snapshot, or None when none was built. The file's
+    mtime is checked on every call, so snapshots built while the server runs
+    are picked up without a restart.
+    """
+    if not question_command_id:
+        return None
+    key = str(question_command_id).strip().lower()
+    path = snapshot_path(key)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _snapshots_lock:
+        cached = _snapshots.get(key)
+        if cached is None or cached[0] != mtime:
+            snapshot = None
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    snapshot = StarterSnapshot(json.load(f)["files"])
+            except Exception as e:
+                logger.warning(f"Could not load starter snapshot {path}: {str(e)}")
+            cached = _snapshots[key] = (mtime, snapshot)
+        return cached[1]
+
+
+def default_starter_dir(question):
+    # question_tmp_folder_location is the src folder of the question's reference copy
+    return os.path.dirname(question.question_tmp_folder_location.rstrip("/"))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] not in ("build", "build-all"):
+        print("Usage: python starter_snapshot.py build <question_command_id> [starter dir]\n"
+              "       python starter_snapshot.py build-all")
+        sys.exit(1)
+
+    if sys.argv[1] == "build":
+        if len(sys.argv) < 3:
+            print("build needs a question_command_id")
+            sys.exit(1)
+        question = get_catalog().get(sys.argv[2])
+        if question is None:
+            print(f"Question ID '{sys.argv[2]}' not found in the CSV.")
+            sys.exit(1)
+        print(save_snapshot(question.question_command_id,
+                            sys.argv[3] if len(sys.argv) > 3 else default_starter_dir(question)))
+    else:
+        built = skipped = 0
+        for question in get_catalog().questions():
+            starter_dir = default_starter_dir(question)
+            if os.path.isdir(starter_dir):
+                save_snapshot(question.question_command_id, starter_dir)
+                built += 1
+            else:
+                skipped += 1
+        print(f"Built {built} starter snapshots, skipped {skipped} questions without a starter directory")
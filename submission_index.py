@@ -0,0 +1,196 @@
+# submission_index.py
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+
+import numpy as np
+
+from metrics import count, register_gauge
+
+logger = logging.getLogger(__name__)
+
+# Empty disables the index
+SUBMISSION_DB_PATH = os.getenv("SUBMISSION_DB_PATH", "submissions.db")
+# Estimated Jaccard similarity of the normalized sources above which an earlier answer is reused
+SUBMISSION_REUSE_THRESHOLD = float(os.getenv("SUBMISSION_REUSE_THRESHOLD", "0.95"))
+SUBMISSION_TTL_SECONDS = int(os.getenv("SUBMISSION_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# 32 bands of 4 rows: pairs above ~0.6 similarity almost always share a bucket
+NUM_PERM = 128
+LSH_BANDS = 32
+SHINGLE_SIZE = 5
+SOURCE_EXTENSIONS = ('.js', '.jsx', '.ts', '.tsx', '.css', '.html')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = np.random.RandomState(42)
+# fixed seed: signatures stored by one process must compare with those of the next
+_PERM_A = _rng.randint(1, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+
+_COMMENTS = re.compile(r"/\*.*?\*/|(?<![:\"'])//[^\n]*", re.S)
+_TOKENS = re.compile(r"[A-Za-z_$][\w$]*|\d+|\S")
+
+
+def normalize_source(text):
+    """Source without comments, with whitespace and formatting differences removed, as tokens."""
+    return _TOKENS.findall(_COMMENTS.sub(" ", text))
+
+
+def read_zip_sources(zip_path):
+    """{path: source} of the source files in a submission zip, skipping node_modules."""
+    sources = {}
+    with zipfile.ZipFile(zip_path) as zf:
+        for name in zf.namelist():
+            if name.endswith(SOURCE_EXTENSIONS) and "node_modules/" not in name and "__MACOSX" not in name:
+                sources[name] = zf.read(name).decode("utf-8", errors="replace")
+    return sources
+
+
+def minhash(sources):
+    """MinHash signature (NUM_PERM uint64) over token shingles of every source file."""
+    shingles = set()
+    for path in sorted(sources):
+        tokens = normalize_source(sources[path])
+        for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1)):
+            shingle = " ".join(tokens[i:i + SHINGLE_SIZE])
+            shingles.add(int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little"))
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    if not shingles:
+        return signature
+    values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    # (a * x + b) mod p per permutation, vectorized over all shingles
+    hashed = (np.outer(values, _PERM_A) + _PERM_B) % np.uint64(_MERSENNE_PRIME) & np.uint64(_MAX_HASH)
+    return hashed.min(axis=0)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+def _band_keys(signature):
+    rows = NUM_PERM // LSH_BANDS
+    return [hashlib.sha1(signature[i * rows:(i + 1) * rows].tobytes()).hexdigest()[:16] for i in range(LSH_BANDS)]
+
+
+def failing_key(test_ids):
+    return json.dumps(sorted(str(t).upper() for t in test_ids or []))
+
+
+class SubmissionIndex:
+    """
+    MinHash/LSH signatures of answered submissions per question, with the
+    category, failing tests and response produced for them. A new submission
+    in the same question, category and failing tests whose signature is within
+    SUBMISSION_REUSE_THRESHOLD gets the earlier response.
+    """
+
+    def __init__(self, db_path=SUBMISSION_DB_PATH, threshold=SUBMISSION_REUSE_THRESHOLD,
+                 ttl_seconds=SUBMISSION_TTL_SECONDS):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._lookups = 0
+        self._reused = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS submissions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    question_command_id TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    failing_tests TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS submission_bands (
+                    question_command_id TEXT NOT NULL,
+                    band INTEGER NOT NULL,
+                    bucket TEXT NOT NULL,
+                    submission_id INTEGER NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS submission_bands_lookup "
+                         "ON submission_bands (question_command_id, band, bucket)")
+        register_gauge("submission_reuse_rate", "Share of submission lookups answered from a near-duplicate",
+                       self.reuse_rate)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def reuse_rate(self):
+        with self._lock:
+            return self._reused / self._lookups if self._lookups else 0.0
+
+    def find(self, question_command_id, signature, category, failing_tests):
+        """(response, similarity) of the most similar matching earlier submission, or None."""
+        question_command_id = question_command_id.lower()
+        with self._connect() as conn:
+            candidate_ids = set()
+            for band, bucket in enumerate(_band_keys(signature)):
+                candidate_ids.update(row[0] for row in conn.execute(
+                    "SELECT submission_id FROM submission_bands WHERE question_command_id = ? AND band = ? AND bucket = ?",
+                    (question_command_id, band, bucket)))
+            best = None
+            if candidate_ids:
+                placeholders = ",".join("?" * len(candidate_ids))
+                rows = conn.execute(
+                    f"SELECT signature, response FROM submissions WHERE id IN ({placeholders}) "
+                    "AND category = ? AND failing_tests = ? AND created_at >= ?",
+                    (*candidate_ids, category, failing_key(failing_tests), time.time() - self.ttl_seconds)).fetchall()
+                for blob, response in rows:
+                    score = similarity(signature, np.frombuffer(blob, dtype=np.uint64))
+                    if score >= self.threshold and (best is None or score > best[1]):
+                        best = (response, score)
+        with self._lock:
+            self._lookups += 1
+            self._reused += 1 if best else 0
+        count("submission_reuse", outcome="reused" if best else "miss")
+        return best
+
+    def add(self, question_command_id, signature, category, failing_tests, response):
+        question_command_id = question_command_id.lower()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "INSERT INTO submissions (question_command_id, category, failing_tests, signature, response, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (question_command_id, category, failing_key(failing_tests), signature.tobytes(), response, time.time()))
+            conn.executemany(
+                "INSERT INTO submission_bands (question_command_id, band, bucket, submission_id) VALUES (?, ?, ?, ?)",
+                [(question_command_id, band, bucket, cursor.lastrowid) for band, bucket in enumerate(_band_keys(signature))])
+            conn.execute("COMMIT")
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            cutoff = time.time() - self.ttl_seconds
+            conn.execute("DELETE FROM submission_bands WHERE submission_id IN "
+                         "(SELECT id FROM submissions WHERE created_at < ?)", (cutoff,))
+            conn.execute("DELETE FROM submissions WHERE created_at < ?", (cutoff,))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_submission_index():
+    """The process-wide index, or None when SUBMISSION_DB_PATH is empty."""
+    global _index
+    if not SUBMISSION_DB_PATH:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = SubmissionIndex()
+            _index.purge_expired()
+        return _index
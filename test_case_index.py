@@ -0,0 +1,170 @@
+# test_case_index.py
+
+import logging
+import os
+import re
+import textwrap
+
+logger = logging.getLogger(__name__)
+
+# Longest assertion source kept per test; the start of a test holds its setup and first expects
+TEST_SOURCE_MAX_CHARS = int(os.getenv("TEST_SOURCE_MAX_CHARS", "1500"))
+
+TEST_CASES_HEADER = "Here are the test cases to verify:"
+
+_LISTED_TEST = re.compile(r"^\s*(TEST_\d+)\s*:\s*(.*?)\s*,?\s*$")
+# ":::TEST_3:::title:::" - how the catalog's jest suites name their tests, and what extract_test_results parses
+_TAGGED_TITLE = re.compile(r":::(.*?):::(.*?):::")
+_BLOCK_START = re.compile(r"\b(describe|it|test)(?:\.only)?\(\s*(['\"`])((?:\\.|(?!\2).)*)\2", re.S)
+# "TEST_5", "test case 5", "tests 4 and 6", "test cases 3, 4 & 5"; every number of the list is a test
+_QUERY_TEST_ID = re.compile(r"\btests?(?:[\s_-]*cases?)?[\s_#-]*(\d+(?:\s*(?:,|&|\band\b|\bor\b)\s*#?\d+)*)\b", re.I)
+
+
+class TestCase:
+    """One test of a question's suite."""
+
+    def __init__(self, test_id, title, describe="", source=""):
+        self.id = test_id
+        self.title = title
+        self.describe = describe
+        self.source = source
+
+    def to_dict(self):
+        return {"id": self.id, "describe": self.describe, "title": self.title, "source": self.source}
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", str(text)).strip().lower().rstrip(".,")
+
+
+def parse_test_case_list(text):
+    """TestCases from the catalog's "TEST_n: title" list."""
+    return [TestCase(m.group(1), m.group(2)) for m in map(_LISTED_TEST.match, (text or "").splitlines()) if m]
+
+
+def _call_end(source, start):
+    """Index just past the parenthesis closing the call opened at or after start."""
+    depth, i, quote = 0, source.index("(", start), None
+    while i < len(source):
+        ch = source[i]
+        if quote:
+            if ch == "\\":
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+        elif ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return len(source)
+
+
+def parse_test_file(source):
+    """TestCases of one jest file, with the enclosing describe title and the test's source."""
+    describes = []  # (end offset, title) of the describe blocks we are inside
+    tests = []
+    for match in _BLOCK_START.finditer(source):
+        while describes and describes[-1][0] <= match.start():
+            describes.pop()
+        kind, title = match.group(1), match.group(3)
+        end = _call_end(source, match.start())
+        tagged = _TAGGED_TITLE.search(title)
+        test_id, title = (tagged.group(1).strip(), tagged.group(2).strip()) if tagged else (None, title)
+        if kind == "describe":
+            describes.append((end, title))
+            continue
+        line_start = source.rfind("\n", 0, match.start()) + 1
+        snippet = textwrap.dedent(source[line_start:end]).strip()
+        if len(snippet) > TEST_SOURCE_MAX_CHARS:
+            snippet = snippet[:TEST_SOURCE_MAX_CHARS] + "\n  // ..."
+        tests.append(TestCase(test_id, title, " > ".join(t for _, t in describes), snippet))
+    return tests
+
+
+def parse_test_dir(tests_dir):
+    """TestCases of every .js/.jsx file under a __tests__ directory, numbered in file order when untagged."""
+    tests = []
+    for root, dirs, files in os.walk(tests_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith((".js", ".jsx")):
+                with open(os.path.join(root, name), "r", encoding="utf-8", errors="replace") as f:
+                    tests.extend(parse_test_file(f.read()))
+    for number, test in enumerate(tests, start=1):
+        test.id = test.id or f"TEST_{number}"
+    return tests
+
+
+class TestCaseIndex:
+    """A question's tests by ID, rendered back into the prompt's test-case block."""
+
+    def __init__(self, tests):
+        self.tests = list(tests)
+        self.by_id = {t.id.lower(): t for t in self.tests}
+        self.by_title = {_normalize(t.title): t for t in self.tests}
+
+    @classmethod
+    def build(cls, test_case_list, tests_dir=None):
+        """
+        Index from the catalog's test list; when the suite's __tests__ directory
+        is readable its describe blocks and sources are added by ID.
+        """
+        tests = parse_test_case_list(test_case_list)
+        if tests_dir and os.path.isdir(tests_dir):
+            try:
+                parsed = parse_test_dir(tests_dir)
+            except Exception as e:
+                logger.warning(f"Could not parse tests in {tests_dir}: {str(e)}")
+                parsed = []
+            by_id = {t.id.lower(): t for t in parsed}
+            for test in tests:
+                found = by_id.get(test.id.lower())
+                if found is not None:
+                    test.describe, test.source = found.describe, found.source
+            tests = tests or parsed
+        return cls(tests)
+
+    def __len__(self):
+        return len(self.tests)
+
+    def lookup(self, test_id=None, title=None):
+        test = self.by_id.get(str(test_id).strip().lower()) if test_id else None
+        if test is None and title:
+            test = self.by_title.get(_normalize(title))
+        return test
+
+    def failing(self, test_results):
+        """The indexed tests listed under test_results["failed"] (extract_test_results output)."""
+        failing = []
+        for failed in (test_results or {}).get("failed", []):
+            if isinstance(failed, dict):
+                test = self.lookup(failed.get("id"), failed.get("text"))
+            else:
+                test = self.lookup(title=failed)
+            if test is not None and test not in failing:
+                failing.append(test)
+        return failing
+
+    def mentioned_in(self, text):
+        """Tests the user names in their query, by number ("TEST_5", "test cases 3 and 5") or by pasted title."""
+        numbers = [n for numbers in _QUERY_TEST_ID.findall(text or "") for n in re.findall(r"\d+", numbers)]
+        mentioned = [self.by_id[f"test_{n}"] for n in numbers if f"test_{n}" in self.by_id]
+        normalized = _normalize(text or "")
+        mentioned += [t for title, t in self.by_title.items() if len(title) > 20 and title in normalized]
+        return list(dict.fromkeys(mentioned))
+
+    def render(self, tests=None, with_source=True):
+        """The "Here are the test cases to verify" block for tests (all of them by default)."""
+        lines = []
+        for test in self.tests if tests is None else tests:
+            lines.append(f"{test.id}: {test.title}")
+            if with_source and test.source:
+                if test.describe:
+                    lines.append(f"  (in describe: {test.describe})")
+                lines.extend(f"  {line}" for line in test.source.splitlines())
+        return TEST_CASES_HEADER + "\n\n```\n" + "\n".join(lines) + "\n```"
@@ -0,0 +1,173 @@
+# tracing.py
+
+import contextvars
+import glob
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from metrics import add_span_listener, percentile
+
+logger = logging.getLogger(__name__)
+
+# Directory the per-request traces are appended to; empty disables tracing output
+TRACE_LOG_DIR = os.getenv("TRACE_LOG_DIR", "traces")
+# Longest string attribute kept on a span - anything longer is payload, not metadata
+MAX_ATTR_CHARS = 64
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+def _is_metadata(value):
+    if isinstance(value, (bool, int, float)) or value is None:
+        return True
+    return isinstance(value, str) and len(value) <= MAX_ATTR_CHARS
+
+
+class Trace:
+    """Timed spans of a single request."""
+
+    def __init__(self, endpoint, request_id=None):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.attrs = {}
+        self.spans = []
+        self._start = time.perf_counter()
+        self._started_at = datetime.now(timezone.utc).isoformat()
+        self._lock = threading.Lock()
+
+    def set(self, **attrs):
+        self.attrs.update({k: v for k, v in attrs.items() if _is_metadata(v)})
+
+    def add_span(self, span):
+        record = {k: v for k, v in span.items() if k != "start" and _is_metadata(v)}
+        record["offset"] = round(span.get("start", self._start) - self._start, 6)
+        with self._lock:
+            self.spans.append(record)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["offset"])
+        return {
+            "request_id": self.request_id,
+            "endpoint": self.endpoint,
+            "started_at": self._started_at,
+            "duration": round(time.perf_counter() - self._start, 6),
+            **self.attrs,
+            "spans": spans,
+        }
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def _record_span(span):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(span)
+
+
+add_span_listener(_record_span)
+
+
+class TraceWriter:
+    """Appends finished traces as JSONL lines from a background thread."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, trace_dict):
+        self._queue.put(trace_dict)
+
+    def _path(self):
+        return os.path.join(self.directory, f"traces-{datetime.now(timezone.utc):%Y%m%d}.jsonl")
+
+    def _run(self):
+        while True:
+            trace_dict = self._queue.get()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self._path(), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace_dict) + "\n")
+            except Exception as e:
+                logger.warning(f"Failed to write trace {trace_dict.get('request_id')}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        self._queue.join()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_trace_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None and TRACE_LOG_DIR:
+            _writer = TraceWriter(TRACE_LOG_DIR)
+        return _writer
+
+
+@contextmanager
+def trace_request(endpoint, request_id=None):
+    """Collect every span finished inside the block into one trace and write it on exit."""
+    trace = Trace(endpoint, request_id)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except Exception:
+        trace.set(outcome="error")
+        raise
+    finally:
+        _current_trace.reset(token)
+        writer = get_trace_writer()
+        if writer is not None:
+            writer.submit(trace.to_dict())
+
+
+# ---------------------- Offline summary ----------------------
+
+def summarize_traces(paths):
+    """Per-stage count, p50 and p95 duration (seconds) over trace files."""
+    durations = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                trace = json.loads(line)
+                durations.setdefault("request", []).append(trace["duration"])
+                for span in trace.get("spans", []):
+                    durations.setdefault(span["stage"], []).append(span["duration"])
+                    if span.get("llm_stage"):
+                        # LLM calls are also broken down by pipeline stage to tune the model routing
+                        durations.setdefault(f"{span['stage']}:{span['llm_stage']}", []).append(span["duration"])
+    return {
+        stage: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95)}
+        for stage, values in durations.items()
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python tracing.py <trace files or glob> ...")
+        sys.exit(1)
+
+    paths = sorted({p for pattern in sys.argv[1:] for p in glob.glob(pattern)})
+    summary = summarize_traces(paths)
+    print(f"{'stage':<40} {'count':>7} {'p50 (s)':>10} {'p95 (s)':>10}")
+    for stage, row in sorted(summary.items(), key=lambda item: item[1]["p95"], reverse=True):
+        print(f"{stage:<40} {row['count']:>7} {row['p50']:>10.3f} {row['p95']:>10.3f}")